@@ -0,0 +1,137 @@
+"""Generation of synthetic content roots, used by the benchmarks."""
+import json
+import os
+import random
+from os.path import join as pjoin
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua enim ad minim veniam "
+    "quis nostrud exercitation ullamco laboris nisi aliquip ex ea commodo "
+    "consequat duis aute irure in reprehenderit voluptate velit esse cillum"
+).split()
+
+CODE_SAMPLE = '''```python
+def fibonacci(n: int) -> int:
+    """Return the n-th fibonacci number."""
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+
+class Node:
+    def __init__(self, value, children=None):
+        self.value = value
+        self.children = children or []
+```'''
+
+
+def _sentence(rng: random.Random, length: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize()
+
+
+def page_markdown(
+    rng: random.Random,
+    title: str,
+    size: int,
+    code_ratio: float,
+    links: list,
+) -> str:
+    """Return a markdown document of roughly *size* bytes."""
+    parts = ["# " + title, ""]
+    current = len(parts[0])
+    section = 0
+    while current < size:
+        roll = rng.random()
+        if roll < code_ratio:
+            block = CODE_SAMPLE
+        elif roll < code_ratio + 0.1:
+            section += 1
+            block = "## Section {}".format(section)
+        elif roll < code_ratio + 0.25:
+            block = "\n".join(
+                "* " + _sentence(rng, 6) for _ in range(rng.randint(2, 6))
+            )
+        elif links and roll < code_ratio + 0.35:
+            block = "See [[{}]] and [[{}]].".format(
+                rng.choice(links), rng.choice(links)
+            )
+        else:
+            block = " ".join(_sentence(rng) + "." for _ in range(4))
+        parts.append(block)
+        parts.append("")
+        current += len(block) + 2
+    return "\n".join(parts)
+
+
+def page_paths(count: int, depth: int, fanout: int = 10) -> list:
+    """
+    Return *count* page paths (without extension).
+
+    Pages are spread in directories up to *depth* levels deep.
+    """
+    paths = []
+    for i in range(count):
+        level = i % (depth + 1)
+        dirs = []
+        rest = i
+        for _ in range(level):
+            dirs.append("d{}".format(rest % fanout))
+            rest //= fanout
+        paths.append("/".join(dirs + ["page{}".format(i)]))
+    return paths
+
+
+def generate(
+    root: str,
+    pages: int = 1000,
+    depth: int = 3,
+    page_size: int = 2048,
+    code_ratio: float = 0.0,
+    todos: int = 0,
+    git: bool = False,
+    seed: int = 42,
+) -> list:
+    """
+    Fill *root* with synthetic content.
+
+    :return: the list of generated page paths, relative to root and
+             without extension
+    """
+    rng = random.Random(seed)
+    paths = page_paths(pages, depth)
+    sample_links = rng.sample(paths, min(len(paths), 50))
+    for path in paths:
+        full_path = pjoin(root, path + ".md")
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w+") as page_file:
+            page_file.write(
+                page_markdown(
+                    rng,
+                    path.rsplit("/", 1)[-1],
+                    page_size,
+                    code_ratio,
+                    sample_links,
+                )
+            )
+    if todos:
+        with open(pjoin(root, "todos.json"), "w+") as todo_file:
+            json.dump(
+                [
+                    {
+                        "id": i,
+                        "text": _sentence(rng, 5),
+                        "done": rng.random() < 0.7,
+                    }
+                    for i in range(todos)
+                ],
+                todo_file,
+            )
+    if git:
+        from git import Repo
+
+        repository = Repo.init(root)
+        repository.git.add(A=True)
+        repository.index.commit("Initial synthetic content")
+    return paths
@@ -0,0 +1,290 @@
+"""
+Run self.wiki's benchmark suite.
+
+Each scenario generates a synthetic content root, then runs in a fresh
+python process (self.wiki reads its configuration at import time) which
+measures cold start and drives the app through Flask's test client.
+
+Usage:
+
+    python benchmarks/run.py [-s SCENARIO ...] [-o results.json]
+    python benchmarks/run.py --compare base.json new.json
+"""
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+from argparse import ArgumentParser
+from datetime import datetime
+from os.path import abspath, dirname, join as pjoin
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+sys.path.insert(0, dirname(abspath(__file__)))
+
+import content  # noqa: E402
+
+SCENARIOS = {
+    "1k": {"pages": 1000},
+    "1k-git": {"pages": 1000, "git": True},
+    "10k": {"pages": 10000},
+    "100k": {"pages": 100000, "page_size": 512},
+    "deep": {"pages": 1000, "depth": 20},
+    "large-pages": {"pages": 100, "page_size": 512 * 1024},
+    "code-heavy": {"pages": 1000, "code_ratio": 0.5},
+    "big-todos": {"pages": 100, "todos": 10000},
+}
+DEFAULT_SCENARIOS = ["1k", "1k-git", "deep", "code-heavy", "big-todos"]
+SAMPLES = 50
+AUTOSAVES = 20
+TODO_MUTATIONS = 50
+
+
+def _summary(durations: list) -> dict:
+    """Summarize a list of durations (in seconds)."""
+    ordered = sorted(durations)
+    return {
+        "n": len(ordered),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "mean": statistics.mean(ordered),
+        "max": ordered[-1],
+    }
+
+
+def _time(func, *args, **kwargs) -> float:
+    start = perf_counter()
+    response = func(*args, **kwargs)
+    elapsed = perf_counter() - start
+    if response.status_code >= 400:
+        raise RuntimeError(
+            "{} {} -> {}".format(func.__name__, args, response.status_code)
+        )
+    return elapsed
+
+
+def worker(paths: list) -> dict:
+    """
+    Measure a single content root, designated by SELF_WIKI_CONTENT_ROOT.
+
+    Must run in a process where self_wiki has not been imported yet.
+    """
+    import logging
+
+    start = perf_counter()
+    import self_wiki
+
+    cold_start = perf_counter() - start
+    logging.getLogger("self_wiki").setLevel(logging.WARNING)
+    client = self_wiki.app.test_client()
+    sample = paths[:: max(1, len(paths) // SAMPLES)][:SAMPLES]
+    results = {"cold_start": cold_start}
+
+    results["page_first"] = _summary(
+        [_time(client.get, "/" + p) for p in sample]
+    )
+    results["page"] = _summary([_time(client.get, "/" + p) for p in sample])
+    results["edit"] = _summary(
+        [_time(client.get, "/" + p + "/edit") for p in sample]
+    )
+    results["search"] = _summary(
+        [_time(client.get, "/search") for _ in range(10)]
+    )
+    results["search_limited"] = _summary(
+        [_time(client.get, "/search?up_to=20") for _ in range(10)]
+    )
+
+    # autosave pattern: the same page, saved over and over with small edits
+    target = "/" + sample[0] + "/edit/save"
+    with open(pjoin(self_wiki.CONTENT_ROOT, sample[0] + ".md")) as page_file:
+        markdown = page_file.read()
+    autosaves = []
+    for i in range(AUTOSAVES):
+        markdown = markdown + "\nedit {}".format(i)
+        autosaves.append(
+            _time(
+                client.put,
+                target,
+                json={"markdown": markdown, "autosave": True},
+            )
+        )
+    results["autosave"] = _summary(autosaves)
+    results["explicit_save"] = _summary(
+        [
+            _time(
+                client.put,
+                target,
+                json={"markdown": markdown + "\nsave {}".format(i)},
+            )
+            for i in range(10)
+        ]
+    )
+
+    first_id = 1000000
+    results["todo_create"] = _summary(
+        [
+            _time(
+                client.post,
+                "/todo",
+                json={"id": first_id + i, "text": "bench", "done": False},
+            )
+            for i in range(TODO_MUTATIONS)
+        ]
+    )
+    results["todo_toggle"] = _summary(
+        [
+            _time(client.put, "/todo", json={"id": first_id + i, "done": True})
+            for i in range(TODO_MUTATIONS)
+        ]
+    )
+    results["todo_list"] = _summary(
+        [_time(client.get, "/todo") for _ in range(10)]
+    )
+    results["todo_page"] = _summary(
+        [_time(client.get, "/todo?done=0&limit=50") for _ in range(10)]
+    )
+    results["todo_delete"] = _summary(
+        [
+            _time(client.delete, "/todo", json={"id": first_id + i})
+            for i in range(TODO_MUTATIONS)
+        ]
+    )
+    return results
+
+
+def run_scenario(name: str) -> dict:
+    """Generate the content for scenario *name*, and measure it."""
+    with TemporaryDirectory() as root:
+        start = perf_counter()
+        paths = content.generate(root, **SCENARIOS[name])
+        generation = perf_counter() - start
+        env = dict(os.environ)
+        env["SELF_WIKI_CONTENT_ROOT"] = root + os.sep
+        env["PYTHONPATH"] = os.pathsep.join(
+            [dirname(dirname(abspath(__file__))), env.get("PYTHONPATH", "")]
+        )
+        proc = subprocess.run(
+            [sys.executable, abspath(__file__), "--worker"],
+            input=json.dumps(paths),
+            env=env,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+    results = json.loads(proc.stdout)
+    results["generation"] = generation
+    results["parameters"] = SCENARIOS[name]
+    return results
+
+
+def _version() -> str:
+    # importing self_wiki would set up a content root: read the source instead
+    init = pjoin(
+        dirname(dirname(abspath(__file__))), "self_wiki", "__init__.py"
+    )
+    with open(init) as init_file:
+        match = re.search(r'__version__ = "([^"]+)"', init_file.read())
+    return match.group(1) if match else ""
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=dirname(abspath(__file__)),
+            universal_newlines=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(base_path: str, new_path: str, threshold: float) -> int:
+    """
+    Print the median ratios between two result files.
+
+    :return: the number of measures that regressed more than *threshold*
+    """
+    with open(base_path) as base_file, open(new_path) as new_file:
+        base, new = json.load(base_file), json.load(new_file)
+    regressions = 0
+    for scenario, measures in sorted(new["scenarios"].items()):
+        if scenario not in base["scenarios"]:
+            continue
+        for measure, value in sorted(measures.items()):
+            old = base["scenarios"][scenario].get(measure)
+            if isinstance(value, dict) and "median" in value:
+                value, old = value["median"], (old or {}).get("median")
+            if not isinstance(value, float) or not old:
+                continue
+            ratio = value / old
+            flag = ""
+            if ratio > 1 + threshold:
+                regressions += 1
+                flag = "  REGRESSION"
+            print(
+                "{:<12} {:<16} {:>10.2f}ms {:>10.2f}ms {:>6.2f}x{}".format(
+                    scenario, measure, old * 1000, value * 1000, ratio, flag
+                )
+            )
+    return regressions
+
+
+def main():
+    """Parse arguments, then run or compare benchmarks."""
+    parser = ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "-s",
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="Scenario to run. May be repeated. Defaults to: "
+        + ", ".join(DEFAULT_SCENARIOS),
+    )
+    parser.add_argument(
+        "-o", "--output", default="bench-results.json", help="Result file"
+    )
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASE", "NEW"),
+        help="Compare two result files instead of running benchmarks",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown considered as a regression by --compare",
+    )
+    parser.add_argument("--worker", action="store_true", help="internal")
+    args = parser.parse_args()
+
+    if args.worker:
+        json.dump(worker(json.load(sys.stdin)), sys.stdout)
+        return 0
+    if args.compare:
+        return 1 if compare(*args.compare, args.threshold) else 0
+
+    results = {
+        "version": _version(),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now().isoformat(),
+        "scenarios": {},
+    }
+    for name in args.scenario or DEFAULT_SCENARIOS:
+        print("Running scenario", name, file=sys.stderr)
+        results["scenarios"][name] = run_scenario(name)
+    with open(args.output, "w+") as output:
+        json.dump(results, output, indent=2, sort_keys=True)
+    print("Results written to", args.output, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
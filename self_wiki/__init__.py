@@ -6,6 +6,7 @@ from flask import Flask
 from git import Repo
 from os.path import exists, expanduser, join as pjoin
 
+from self_wiki import wiki
 from self_wiki.wiki import repository
 
 __version__ = "0.8.0"
@@ -31,5 +32,7 @@ if not exists(CONTENT_ROOT):
 
 if exists(pjoin(CONTENT_ROOT, ".git")):
     repository = Repo(CONTENT_ROOT)
+    # Page.save commits using self_wiki.wiki's reference
+    wiki.repository = repository
     logger.info("Git integration is enabled. self.wiki will commit changes")
 from self_wiki import views
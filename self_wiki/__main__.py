@@ -19,8 +19,48 @@ def main():
         "--host", default="localhost", help="address to bind on"
     )
     parser.add_argument("-p", "--port", default=4000, help="Port to listen on")
+    subparsers = parser.add_subparsers(dest="command")
+    export_parser = subparsers.add_parser(
+        "export", help="Export the wiki as a static HTML site"
+    )
+    export_parser.add_argument("output", help="Directory to write the site in")
+    export_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of rendering processes. Defaults to the number of CPUs",
+    )
+    export_parser.add_argument(
+        "--full",
+        default=False,
+        help="Re-render every page, instead of only the changed ones",
+        action="store_true",
+    )
+    subparsers.add_parser(
+        "precompress", help="Compress static assets ahead of time"
+    )
     args = vars(parser.parse_args())
     if args["debug"]:
         logger.setLevel(logging.DEBUG)
+    if args["command"] == "export":
+        from self_wiki import CONTENT_ROOT
+        from self_wiki.export import Exporter
+        from self_wiki.views import TITLE_PREFIX
+
+        Exporter(
+            CONTENT_ROOT,
+            args["output"],
+            jobs=args["jobs"],
+            title_prefix=TITLE_PREFIX,
+        ).export(full=args["full"])
+        return
+    if args["command"] == "precompress":
+        from self_wiki.views import STATIC_ASSETS
+
+        logger.info(
+            "Compressed %d static assets", STATIC_ASSETS.precompress_all()
+        )
+        return
     os.environ["FLASK_APP"] = "self_wiki"
     app.run(debug=args["debug"], host=args["host"], port=args["port"])
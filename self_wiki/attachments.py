@@ -0,0 +1,149 @@
+"""
+Content-addressed storage for uploaded files.
+
+Uploads are streamed to disk while being hashed. Each distinct content is
+stored once, under CONTENT_ROOT/.attachments/, and linked (hard link when
+possible, copy otherwise) next to the page it was attached to.
+
+As files of the content root may be hard links to the stored blobs, they
+must never be rewritten in place: see replace_file.
+"""
+import logging
+import os
+import shutil
+from hashlib import sha256
+from os.path import basename, dirname, exists, join as pjoin, samefile
+from tempfile import NamedTemporaryFile
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+STORE_DIRNAME = ".attachments"
+# Files of the content root self.wiki writes itself: not to be uploaded
+RESERVED_SUFFIXES = (".md",)
+RESERVED_NAMES = ("todos.json",)
+
+# the mode of newly created files, as open() would set it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+def replace_file(path: str, text: str):
+    """
+    Write *text* to *path*, through a temporary file then replacing it.
+
+    Writing *path* in place would also change every other hard link to it.
+    """
+    with NamedTemporaryFile(
+        "w",
+        dir=dirname(path) or ".",
+        prefix=".{}.".format(basename(path)),
+        delete=False,
+    ) as tmp_file:
+        tmp_file.write(text)
+    try:
+        os.chmod(tmp_file.name, FILE_MODE)
+        os.replace(tmp_file.name, path)
+    except OSError:
+        os.remove(tmp_file.name)
+        raise
+
+
+def is_reserved(filename: str) -> bool:
+    """Tell if *filename* is one of the files self.wiki writes itself."""
+    return filename in RESERVED_NAMES or filename.endswith(RESERVED_SUFFIXES)
+
+
+class HashingFile:
+    """A temporary file, hashing everything written to it."""
+
+    def __init__(self, directory: str):
+        """Create a new temporary file in *directory*."""
+        self._file = NamedTemporaryFile(dir=directory, delete=False)
+        self._hash = sha256()
+        self.name = self._file.name
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        """Write *data* to the file, and feed it to the hash."""
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self) -> str:
+        """Return the hash of everything written so far."""
+        return self._hash.hexdigest()
+
+    def discard(self):
+        """Close and remove the temporary file."""
+        self._file.close()
+        if exists(self.name):
+            os.remove(self.name)
+
+    def __getattr__(self, name):
+        """Delegate everything else to the underlying file."""
+        return getattr(self._file, name)
+
+
+class AttachmentStore:
+    """A content-addressed store, with per-page links to its blobs."""
+
+    def __init__(self, content_root: str):
+        """
+        Create a new store in *content_root*.
+
+        :param content_root: the wiki's content root. The store itself lives
+                             in its STORE_DIRNAME subdirectory.
+        """
+        self.content_root = content_root
+        self.root = pjoin(content_root, STORE_DIRNAME)
+        self._tmp = pjoin(self.root, "tmp")
+
+    def stream_factory(
+        self,
+        total_content_length: Optional[int] = None,
+        content_type: Optional[str] = None,
+        filename: Optional[str] = None,
+        content_length: Optional[int] = None,
+    ) -> HashingFile:
+        """Return a file uploads can be streamed to, for werkzeug's parser."""
+        os.makedirs(self._tmp, exist_ok=True)
+        return HashingFile(self._tmp)
+
+    def blob_path(self, digest: str) -> str:
+        """Return where the content hashed as *digest* is stored."""
+        return pjoin(self.root, digest[:2], digest)
+
+    def add(self, upload: HashingFile, target: str) -> bool:
+        """
+        Store *upload*, and link it at *target*.
+
+        :param upload: a fully written HashingFile
+        :param target: the full path the attachment should be visible at
+        :return: False if *target* already had this exact content
+        """
+        upload.close()
+        digest = upload.hexdigest()
+        blob = self.blob_path(digest)
+        if exists(blob):
+            logger.debug("Attachment %s already stored as %s", target, blob)
+            os.remove(upload.name)
+        else:
+            os.makedirs(dirname(blob), exist_ok=True)
+            # temporary files are only readable by their owner, while a
+            # front proxy may have to serve them
+            os.chmod(upload.name, FILE_MODE)
+            os.replace(upload.name, blob)
+        if exists(target) and samefile(blob, target):
+            return False
+        os.makedirs(dirname(target), exist_ok=True)
+        link = pjoin(
+            dirname(target), ".{}.{}".format(basename(target), digest[:12])
+        )
+        try:
+            os.link(blob, link)
+        except OSError:
+            shutil.copyfile(blob, link)
+        os.replace(link, target)
+        return True
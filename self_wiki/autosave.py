@@ -0,0 +1,173 @@
+"""
+Write-behind buffering of the editor's autosaves.
+
+Open editors send their content every few seconds, mostly intermediate
+states nobody will ever read. WriteBehindBuffer keeps the latest autosaved
+content of each page in memory, and only writes it once per durability
+window, on an explicit save, or when the process exits. Reads are served
+from the buffer in the meantime. A write that fails is retried once per
+durability window.
+
+Every write of a given path, buffered or not, goes through the same
+per-path lock, so that a file is never written by two threads at once.
+"""
+import atexit
+import logging
+from contextlib import contextmanager
+from threading import Condition, Lock, Thread
+from time import monotonic
+from typing import Callable, Optional
+
+from self_wiki.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# flush(path, markdown, context)
+FlushFunction = Callable[[str, str, object], None]
+
+
+class WriteBehindBuffer:
+    """Buffer page writes for up to *delay* seconds."""
+
+    def __init__(self, flush: FlushFunction, delay: float = 60.0):
+        """
+        Create a new, empty, buffer.
+
+        :param flush: called to actually write a page, as
+                      flush(path, markdown, context)
+        :param delay: how long, in seconds, an autosave may stay in memory.
+                      0 disables buffering.
+        """
+        self._flush = flush
+        self.delay = delay
+        # path -> (deadline, markdown, context)
+        self._pending = {}  # type: dict
+        self._locks = {}  # type: dict
+        # path -> number of failed writes in a row
+        self._failures = {}  # type: dict
+        self._condition = Condition()
+        self._thread = None  # type: Optional[Thread]
+        atexit.register(self.flush_all)
+
+    @contextmanager
+    def lock(self, path: str):
+        """Hold the lock of *path*, for writing it."""
+        with self._condition:
+            lock = self._locks.setdefault(path, Lock())
+        with lock:
+            yield
+
+    def get(self, path: str) -> Optional[str]:
+        """Return the buffered content of *path*, if any."""
+        entry = self._pending.get(path)
+        return None if entry is None else entry[1]
+
+    def __len__(self):
+        """Return the number of buffered pages."""
+        return len(self._pending)
+
+    def autosave(self, path: str, markdown: str, context: object = None):
+        """
+        Buffer an autosave of *path*.
+
+        It will be written within the durability window, unless a more
+        recent write comes first.
+        """
+        if self.delay <= 0:
+            self.save(path, markdown, context)
+            return
+        with self._condition:
+            entry = self._pending.get(path)
+            deadline = monotonic() + self.delay
+            if entry is not None:
+                # later autosaves don't push the write back
+                deadline = entry[0]
+            self._pending[path] = (deadline, markdown, context)
+            if self._thread is None:
+                self._thread = Thread(
+                    target=self._run, name="self.wiki autosave", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+        METRICS.incr("self_wiki_autosaves_total", result="buffered")
+
+    def save(self, path: str, markdown: str, context: object = None):
+        """Write *path* now, replacing any buffered autosave."""
+        with self.lock(path):
+            with self._condition:
+                self._pending.pop(path, None)
+            self._flush(path, markdown, context)
+            with self._condition:
+                self._failures.pop(path, None)
+        METRICS.incr("self_wiki_autosaves_total", result="written")
+
+    def flush(self, path: str):
+        """Write the buffered autosave of *path*, if any."""
+        with self.lock(path):
+            entry = self._pending.get(path)
+            if entry is None:
+                return
+            self._flush(path, entry[1], entry[2])
+            # keep serving the buffered content until it is written, and
+            # keep the autosaves that came in meanwhile
+            with self._condition:
+                if self._pending.get(path) is entry:
+                    del self._pending[path]
+                self._failures.pop(path, None)
+        METRICS.incr("self_wiki_autosaves_total", result="flushed")
+
+    def discard(self, path: str):
+        """Forget the buffered autosave of *path*, if any."""
+        with self.lock(path):
+            self.take(path)
+
+    def take(self, path: str) -> Optional[str]:
+        """
+        Forget the buffered autosave of *path*, and return its content.
+
+        For callers writing *path* themselves, while holding lock(path).
+        """
+        with self._condition:
+            entry = self._pending.pop(path, None)
+            self._failures.pop(path, None)
+        return None if entry is None else entry[1]
+
+    def flush_all(self):
+        """Write every buffered autosave."""
+        for path in list(self._pending):
+            try:
+                self.flush(path)
+            except Exception:  # pylint: disable=W0703
+                logger.exception("Could not write %s", path)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                now = monotonic()
+                due = [p for p, e in self._pending.items() if e[0] <= now]
+                if not due:
+                    deadlines = [e[0] for e in self._pending.values()]
+                    timeout = min(deadlines) - now if deadlines else None
+                    self._condition.wait(timeout)
+                    continue
+            for path in due:
+                try:
+                    self.flush(path)
+                except Exception:  # pylint: disable=W0703
+                    self._retry_later(path)
+
+    def _retry_later(self, path: str):
+        """Push the write of *path* back by a durability window."""
+        with self._condition:
+            entry = self._pending.get(path)
+            if entry is not None:
+                self._pending[path] = (monotonic() + self.delay,) + entry[1:]
+            failures = self._failures.get(path, 0) + 1
+            self._failures[path] = failures
+        METRICS.incr("self_wiki_autosaves_total", result="failed")
+        if failures == 1:
+            logger.exception(
+                "Could not write %s, retrying every %ss", path, self.delay
+            )
+        else:
+            logger.debug("Could not write %s (%d failures)", path, failures)
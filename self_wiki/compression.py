@@ -0,0 +1,155 @@
+"""
+HTTP response compression.
+
+Dynamic responses are compressed on the fly, provided they are large enough.
+Static assets are compressed once, and the resulting .gz (and .br, if the
+brotli module is installed) files are served as-is afterwards.
+"""
+import gzip
+import logging
+import mimetypes
+import os
+from os.path import exists, getmtime, isfile, join as pjoin
+from tempfile import NamedTemporaryFile, gettempdir
+from typing import Iterable, Optional
+
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "image/x-icon",
+    "image/vnd.microsoft.icon",
+)
+
+
+def available_encodings() -> Iterable[str]:
+    """Return the supported encodings, preferred first."""
+    if brotli is not None:
+        return ("br", "gzip")
+    return ("gzip",)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Pick an encoding, given an Accept-Encoding header value.
+
+    :return: the chosen encoding, or None if no encoding is acceptable
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(mimetype: Optional[str]) -> bool:
+    """Tell if it's worth compressing content of type *mimetype*."""
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(data: bytes, encoding: str, level: int = 6) -> bytes:
+    """
+    Compress *data*.
+
+    :param level: gzip level, from 1 to 9. Brotli's quality is scaled
+                  accordingly.
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=min(11, level + 2))
+    return gzip.compress(data, compresslevel=level)
+
+
+class StaticPrecompressor:
+    """Compress static assets once, and remember where they were put."""
+
+    def __init__(self, static_folder: str, cache_dir: str = ""):
+        """
+        Create a new precompressor.
+
+        :param static_folder: where the static assets are
+        :param cache_dir: where compressed assets are written. Defaults to
+                          static_folder if writable, a temporary directory
+                          otherwise.
+        """
+        self.static_folder = static_folder
+        if not cache_dir:
+            cache_dir = static_folder
+            if not os.access(static_folder, os.W_OK):
+                cache_dir = pjoin(gettempdir(), "self.wiki-static")
+        self.cache_dir = cache_dir
+
+    def path_for(self, filename: str, encoding: str) -> Optional[str]:
+        """
+        Return the path to the *encoding* compressed version of *filename*.
+
+        The compressed file is (re)created if missing or outdated.
+
+        :return: None if the asset is missing, outside of the static folder,
+                 or not worth compressing
+        """
+        source = safe_join(self.static_folder, filename)
+        if source is None or not isfile(source):
+            return None
+        if not is_compressible(mimetypes.guess_type(filename)[0]):
+            return None
+        try:
+            source_mtime = getmtime(source)
+        except OSError:
+            return None
+        target = pjoin(
+            self.cache_dir,
+            os.path.relpath(source, self.static_folder) + SUFFIXES[encoding],
+        )
+        if exists(target) and getmtime(target) >= source_mtime:
+            return target
+        with open(source, "rb") as source_file:
+            data = compress(source_file.read(), encoding, level=9)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with NamedTemporaryFile(
+            dir=os.path.dirname(target), delete=False
+        ) as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_file.name, target)
+        logger.debug("Compressed %s to %s", source, target)
+        return target
+
+    def precompress_all(self) -> int:
+        """
+        Compress every static asset, with every available encoding.
+
+        :return: the number of compressed files
+        """
+        count = 0
+        for path, dirnames, filenames in os.walk(self.static_folder):
+            for fname in filenames:
+                if fname.endswith(tuple(SUFFIXES.values())):
+                    continue
+                name = os.path.relpath(pjoin(path, fname), self.static_folder)
+                for encoding in available_encodings():
+                    if self.path_for(name, encoding) is not None:
+                        count += 1
+        return count
@@ -0,0 +1,327 @@
+"""
+Export the wiki as a static, read-only, HTML site.
+
+Pages are rendered with the same templates as the running application, in a
+pool of processes. A manifest, kept in the output directory, allows later
+exports to only re-render pages whose content, or whose child pages' titles,
+changed.
+
+Exported pages are read-only: links to other pages are pointed to their
+.html files, and the widgets backed by the application's API (todos,
+search, shortcuts) are left out.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from os.path import dirname, exists, join as pjoin, relpath
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from flask import render_template
+
+from markupsafe import Markup
+
+from self_wiki import __version__, app
+from self_wiki.attachments import STORE_DIRNAME
+from self_wiki.wiki import Page
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".export-manifest.json"
+STATIC_ROOT = pjoin(dirname(__file__), "static")
+TEMPLATES_ROOT = pjoin(dirname(__file__), "templates")
+BATCH_SIZE = 32
+IGNORED_NAMES = (".git", STORE_DIRNAME, "todos.json")
+# bumped when the exported HTML changes, to invalidate previous exports
+EXPORT_FORMAT = 2
+HREF_RE = re.compile(r'(\shref=")([^"]*)(")')
+
+
+def _hash_file(path: str) -> str:
+    digest = sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _walk(root: str) -> Iterable[str]:
+    """Yield the path of every file in *root*, relative to it."""
+    for path, dirnames, filenames in os.walk(root):
+        dirnames[:] = [
+            d for d in dirnames if d not in IGNORED_NAMES and d[0] != "."
+        ]
+        for fname in filenames:
+            if fname in IGNORED_NAMES or fname[0] == ".":
+                continue
+            yield relpath(pjoin(path, fname), root)
+
+
+def static_href(url: str) -> str:
+    """
+    Return the URL of a page in the exported site.
+
+    Links to pages (/path/to/page, relative ones, or wikilinks' /Page/) are
+    pointed to their .html file. Other links, to attachments or to other
+    sites, are returned unchanged.
+    """
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path:
+        return url
+    path = parts.path
+    if path == "/":
+        path = "/index"
+    path = path.rstrip("/")
+    name = path.rpartition("/")[2]
+    if name.endswith(".md"):
+        path = path[:-3]
+    elif "." in name or not name:
+        return url
+    return urlunsplit(parts._replace(path=path + ".html"))
+
+
+def _static_links(html: str) -> str:
+    return HREF_RE.sub(
+        lambda m: m.group(1) + static_href(m.group(2)) + m.group(3), html
+    )
+
+
+def fingerprint_assets(output: str) -> Dict[str, str]:
+    """
+    Copy static assets to *output*/static, with fingerprinted names.
+
+    :return: a mapping between asset names and their fingerprinted ones
+    """
+    assets = {}
+    for name in _walk(STATIC_ROOT):
+        base, dot, ext = name.rpartition(".")
+        if not dot:
+            base, ext = name, ""
+        fingerprinted = "{}.{}{}{}".format(
+            base, _hash_file(pjoin(STATIC_ROOT, name))[:10], dot, ext
+        )
+        target = pjoin(output, "static", fingerprinted)
+        if not exists(target):
+            os.makedirs(dirname(target), exist_ok=True)
+            shutil.copyfile(pjoin(STATIC_ROOT, name), target)
+        assets[name.replace(os.sep, "/")] = fingerprinted.replace(os.sep, "/")
+    return assets
+
+
+def _render_batch(
+    content_root: str,
+    output: str,
+    relpaths: List[str],
+    assets: Dict[str, str],
+    title_prefix: str,
+) -> List[Tuple[str, str, Dict[str, str]]]:
+    """
+    Render pages, and write them to *output*.
+
+    Runs in a worker process.
+
+    :return: a list of (relpath, title, {child relpath: child title})
+    """
+
+    def url_for(endpoint, filename=None, **_):
+        if endpoint == "static":
+            return "/static/" + assets.get(filename, filename)
+        return "/"
+
+    rendered = []
+    with app.test_request_context():
+        for page_relpath in relpaths:
+            page = Page(page_relpath, root=content_root, shallow=False)
+            html = render_template(
+                "page.html.j2",
+                url_for=url_for,
+                favicon="",
+                title_prefix=title_prefix,
+                page=page,
+                recent=Markup(""),
+                static_export=True,
+            )
+            target = pjoin(output, page_relpath[:-3] + ".html")
+            os.makedirs(dirname(target), exist_ok=True)
+            with open(target, "w+") as html_file:
+                html_file.write(_static_links(html))
+            rendered.append(
+                (
+                    page_relpath,
+                    page.title,
+                    {
+                        relpath(c.path, content_root): c.title
+                        for c in page.subpages
+                    },
+                )
+            )
+    return rendered
+
+
+def _children(pages: Iterable[str]) -> Dict[str, List[str]]:
+    """Map each page to its direct child pages, as Page.load finds them."""
+    children = {p: [] for p in pages}  # type: Dict[str, List[str]]
+    for page_relpath in sorted(children):
+        parent = dirname(page_relpath) + ".md"
+        if parent in children:
+            children[parent].append(page_relpath)
+    return children
+
+
+class Exporter:
+    """Export a content root as a static site."""
+
+    def __init__(
+        self,
+        content_root: str,
+        output: str,
+        jobs: Optional[int] = None,
+        title_prefix: str = "self.wiki ",
+    ):
+        """
+        Create a new exporter.
+
+        :param content_root: the wiki's content root
+        :param output: the directory to write the site in
+        :param jobs: number of worker processes. None means one per CPU, 1
+                     renders in the current process.
+        :param title_prefix: page <title> prefix
+        """
+        self.content_root = content_root
+        self.output = output
+        self.jobs = jobs
+        self.title_prefix = title_prefix
+        self.manifest_path = pjoin(output, MANIFEST_NAME)
+
+    def _load_manifest(self) -> dict:
+        if not exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as manifest_file:
+            return json.load(manifest_file)
+
+    def _templates_fingerprint(self, assets: Dict[str, str]) -> str:
+        digest = sha256(__version__.encode("utf-8"))
+        digest.update(str(EXPORT_FORMAT).encode("utf-8"))
+        digest.update(self.title_prefix.encode("utf-8"))
+        for name in sorted(os.listdir(TEMPLATES_ROOT)):
+            digest.update(_hash_file(pjoin(TEMPLATES_ROOT, name)).encode())
+        digest.update(json.dumps(assets, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _render(self, relpaths: List[str], assets: Dict[str, str]) -> list:
+        batches = [
+            relpaths[i : i + BATCH_SIZE]  # noqa
+            for i in range(0, len(relpaths), BATCH_SIZE)
+        ]
+        args = (self.content_root, self.output)
+        if self.jobs == 1 or len(batches) <= 1:
+            results = [
+                _render_batch(*args, b, assets, self.title_prefix)
+                for b in batches
+            ]
+        else:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                futures = [
+                    pool.submit(
+                        _render_batch, *args, b, assets, self.title_prefix
+                    )
+                    for b in batches
+                ]
+                results = [f.result() for f in futures]
+        return [page for batch in results for page in batch]
+
+    def export(self, full: bool = False) -> Dict[str, int]:
+        """
+        Export the content root.
+
+        :param full: ignore the previous export's manifest
+        :return: counters: rendered, unchanged and removed pages, copied
+                 attachments
+        """
+        os.makedirs(self.output, exist_ok=True)
+        previous = {} if full else self._load_manifest()
+        assets = fingerprint_assets(self.output)
+        fingerprint = self._templates_fingerprint(assets)
+        if previous.get("fingerprint") != fingerprint:
+            previous = {}
+        old_pages = previous.get("pages", {})  # type: Dict[str, dict]
+        old_files = previous.get("files", {})  # type: Dict[str, list]
+
+        hashes, files = {}, {}
+        for name in _walk(self.content_root):
+            path = pjoin(self.content_root, name)
+            if name.endswith(".md"):
+                hashes[name] = _hash_file(path)
+            else:
+                stat_result = os.stat(path)
+                files[name] = [stat_result.st_size, stat_result.st_mtime]
+
+        # first pass: pages whose content, or children list, changed
+        children = _children(hashes)
+        dirty = [
+            p
+            for p in sorted(hashes)
+            if p not in old_pages
+            or old_pages[p]["hash"] != hashes[p]
+            or sorted(old_pages[p]["children"]) != children[p]
+        ]
+        pages = {p: old_pages[p] for p in hashes if p not in dirty}
+        for page_relpath, title, child_titles in self._render(dirty, assets):
+            pages[page_relpath] = {
+                "hash": hashes[page_relpath],
+                "title": title,
+                "children": child_titles,
+            }
+        # second pass: pages showing a child whose title changed
+        stale = [
+            p
+            for p in sorted(pages)
+            if p not in dirty
+            and any(
+                pages[c]["title"] != title
+                for c, title in pages[p]["children"].items()
+            )
+        ]
+        for page_relpath, title, child_titles in self._render(stale, assets):
+            pages[page_relpath]["children"] = child_titles
+
+        removed = 0
+        for page_relpath in set(old_pages) - set(hashes):
+            target = pjoin(self.output, page_relpath[:-3] + ".html")
+            if exists(target):
+                os.remove(target)
+            removed += 1
+        copied = 0
+        for name, signature in files.items():
+            target = pjoin(self.output, name)
+            if old_files.get(name) == signature and exists(target):
+                continue
+            os.makedirs(dirname(target), exist_ok=True)
+            shutil.copy2(pjoin(self.content_root, name), target)
+            copied += 1
+        for name in set(old_files) - set(files):
+            if exists(pjoin(self.output, name)):
+                os.remove(pjoin(self.output, name))
+
+        with open(self.manifest_path, "w+") as manifest_file:
+            json.dump(
+                {"fingerprint": fingerprint, "pages": pages, "files": files},
+                manifest_file,
+            )
+        stats = {
+            "rendered": len(dirty) + len(stale),
+            "unchanged": len(hashes) - len(dirty) - len(stale),
+            "removed": removed,
+            "copied": copied,
+        }
+        logger.info(
+            "Exported %s to %s: %s",
+            self.content_root,
+            self.output,
+            ", ".join("{} {}".format(v, k) for k, v in stats.items()),
+        )
+        return stats
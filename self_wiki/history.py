@@ -0,0 +1,253 @@
+"""
+Page history, read from the content root's git repository.
+
+Running `git log -- <path>` for each request gets slow once the repository
+holds many (auto)save commits. Instead, HistoryIndex maintains a persisted
+path -> commits index, brought up to date incrementally by reading only the
+commits made since its last update.
+
+The index is persisted as an append-only log, one JSON line per commit, so
+that an update only writes the new commits. It is first built in the
+background: until then, history requests are answered by git itself.
+"""
+import json
+import logging
+import os
+from collections import OrderedDict
+from os.path import exists
+from threading import Event, Lock, Thread
+from typing import Dict, List, Optional
+
+from git import Git, GitCommandError
+
+from gitdb.exc import BadName, BadObject
+
+logger = logging.getLogger(__name__)
+
+_FIELD_SEP = "\x1f"
+_COMMIT_MARK = "\x1e"
+_LOG_FORMAT = _COMMIT_MARK + _FIELD_SEP.join(("%H", "%at", "%an", "%s"))
+
+
+def _parse_log(log: str) -> List[list]:
+    """Parse `git log` output, as [sha, time, author, message, paths]."""
+    commits = []
+    for entry in log.split(_COMMIT_MARK)[1:]:
+        lines = entry.split("\n")
+        sha, timestamp, author, message = lines[0].split(_FIELD_SEP, 3)
+        commits.append(
+            [sha, int(timestamp), author, message, [p for p in lines[1:] if p]]
+        )
+    return commits
+
+
+class HistoryIndex:
+    """A persisted, incrementally updated, path -> commits index."""
+
+    # 2: paths are no longer C-quoted
+    # 3: append-only log of commits
+    FORMAT_VERSION = 3
+
+    def __init__(self, repository, index_path: str, blob_cache_size=256):
+        """
+        Create a new index.
+
+        :param repository: a git.Repo object
+        :param index_path: where the index is persisted
+        :param blob_cache_size: number of file revisions kept in memory
+        """
+        self.repository = repository
+        self.index_path = index_path
+        self._head = None  # type: Optional[str]
+        self._paths = {}  # type: Dict[str, List[str]]
+        self._commits = {}  # type: Dict[str, list]
+        self._lock = Lock()
+        self._ready = Event()
+        self._blobs = OrderedDict()  # type: OrderedDict
+        self._blob_cache_size = blob_cache_size
+        self._load()
+
+    def _index(self, commit: list):
+        sha, timestamp, author, message, paths = commit
+        self._commits[sha] = [timestamp, author, message]
+        for path in paths:
+            self._paths.setdefault(path, []).append(sha)
+        self._head = sha
+
+    def _load(self):
+        if not exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as index_file:
+            data = index_file.read()
+        lines = data.split(b"\n")
+        try:
+            header = json.loads(lines[0].decode("utf-8"))
+        except ValueError:
+            header = None
+        if (
+            not isinstance(header, dict)
+            or header.get("version") != self.FORMAT_VERSION
+        ):
+            logger.info("Ignoring outdated index %s", self.index_path)
+            return
+        valid_size = len(lines[0]) + 1
+        # the last item is either empty, or an interrupted write
+        for line in lines[1:-1]:
+            try:
+                commit = json.loads(line.decode("utf-8"))
+            except ValueError:
+                break
+            self._index(commit)
+            valid_size += len(line) + 1
+        if valid_size < len(data):
+            logger.warning("Truncating corrupted index %s", self.index_path)
+            with open(self.index_path, "r+b") as index_file:
+                index_file.truncate(valid_size)
+
+    def _persist(self, commits: List[list], rebuild: bool):
+        """Append *commits* to the persisted index, or rewrite it."""
+        lines = "".join(
+            json.dumps(c, separators=(",", ":")) + "\n" for c in commits
+        )
+        if rebuild or not exists(self.index_path):
+            header = json.dumps({"version": self.FORMAT_VERSION}) + "\n"
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w+", encoding="utf-8") as index_file:
+                index_file.write(header + lines)
+            os.replace(tmp_path, self.index_path)
+        elif lines:
+            with open(self.index_path, "a", encoding="utf-8") as index_file:
+                index_file.write(lines)
+
+    def _git(self) -> Git:
+        # a git runner of our own, as the index is updated in a background
+        # thread, and git.Repo objects are not thread-safe
+        return Git(self.repository.working_dir)
+
+    def _head_commit(self) -> Optional[str]:
+        try:
+            return self._git().rev_parse("--verify", "-q", "HEAD")
+        except GitCommandError:  # no commit yet
+            return None
+
+    def _is_ancestor(self, ancestor: str, rev: str) -> bool:
+        try:
+            self._git().merge_base("--is-ancestor", ancestor, rev)
+        except GitCommandError:
+            return False
+        return True
+
+    def _log(self, *args) -> str:
+        # don't quote non-ASCII paths: they are looked up as-is
+        return self._git()(c="core.quotepath=off").log(
+            "--name-only", "--no-renames", "--format=" + _LOG_FORMAT, *args
+        )
+
+    def start(self):
+        """Bring the index up to date in a background thread."""
+        Thread(
+            target=self._build, name="self.wiki history", daemon=True
+        ).start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the index to be built. Tell if it is."""
+        return self._ready.wait(timeout)
+
+    def _build(self):
+        try:
+            self.update()
+        except Exception:  # pylint: disable=W0703
+            logger.exception("Could not index %s", self.index_path)
+            return
+        self._ready.set()
+
+    def update(self) -> int:
+        """
+        Index the commits made since the last update.
+
+        :return: the number of newly indexed commits
+        """
+        with self._lock:
+            head = self._head_commit()
+            if head is None or head == self._head:
+                self._ready.set()
+                return 0
+            revisions = head
+            rebuild = self._head is None
+            if self._head is not None:
+                if self._is_ancestor(self._head, head):
+                    revisions = "{}..{}".format(self._head, head)
+                else:
+                    logger.info("History was rewritten, re-indexing it")
+                    self._paths, self._commits = {}, {}
+                    rebuild = True
+            commits = _parse_log(self._log(revisions, "--reverse"))
+            for commit in commits:
+                self._index(commit)
+            self._head = head
+            self._persist(commits, rebuild)
+            self._ready.set()
+            logger.debug("Indexed %d new commit(s)", len(commits))
+            return len(commits)
+
+    def history(self, path: str) -> List[Dict[str, object]]:
+        """
+        Return the commits that changed *path*, most recent first.
+
+        :param path: a path relative to the repository's root
+        """
+        if not self._ready.is_set():
+            # still being built: don't wait for it
+            return [
+                {
+                    "rev": sha,
+                    "timestamp": timestamp,
+                    "author": author,
+                    "message": message,
+                }
+                for sha, timestamp, author, message, _ in _parse_log(
+                    self._log("--", path)
+                )
+            ]
+        self.update()
+        with self._lock:
+            shas = list(reversed(self._paths.get(path, [])))
+            return [
+                {
+                    "rev": sha,
+                    "timestamp": self._commits[sha][0],
+                    "author": self._commits[sha][1],
+                    "message": self._commits[sha][2],
+                }
+                for sha in shas
+            ]
+
+    def read(self, path: str, rev: str) -> Optional[bytes]:
+        """
+        Return the content of *path* at revision *rev*.
+
+        Contents are read from git's object database, and the most recently
+        used ones are kept in memory.
+
+        :return: None if *path* does not exist at *rev*
+        """
+        try:
+            commit = self.repository.commit(rev)
+            tree = commit.tree
+        except (BadName, BadObject, ValueError):
+            return None
+        key = (commit.hexsha, path)
+        with self._lock:
+            if key in self._blobs:
+                self._blobs.move_to_end(key)
+                return self._blobs[key]
+        try:
+            blob = tree / path
+        except KeyError:
+            return None
+        data = blob.data_stream.read()
+        with self._lock:
+            self._blobs[key] = data
+            while len(self._blobs) > self._blob_cache_size:
+                self._blobs.popitem(last=False)
+        return data
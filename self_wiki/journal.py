@@ -0,0 +1,185 @@
+"""
+Journal rollups.
+
+Deleting a done todo appends it to the day's journal page,
+journal/<year>/<month>/<day>.md. JournalIndex keeps the "Done" entries of
+each of these pages, so that a month or a year of them can be listed
+without reading every page: pages are only parsed again when their mtime
+or size changed, or when the journal writer reports a change.
+"""
+import json
+import logging
+import os
+import re
+from datetime import date, timedelta
+from os.path import exists, join as pjoin
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = "journal"
+DAY_PATH_RE = re.compile(
+    r"^" + JOURNAL_DIR + r"/(\d{4})/(\d{2})/(\d{2})\.md$"
+)
+HEADER_RE = re.compile(r"^#+ *(.*?) *#*$")
+ITEM_RE = re.compile(r"^[*+-] +(.*)$")
+
+
+def done_entries(markdown: str) -> List[str]:
+    """Return the items listed under the "Done" header(s) of *markdown*."""
+    entries = []
+    in_done = False
+    for line in markdown.split("\n"):
+        header = HEADER_RE.match(line)
+        if header:
+            in_done = header.group(1).lower() == "done"
+            continue
+        item = ITEM_RE.match(line)
+        if in_done and item:
+            entries.append(item.group(1).strip())
+    return entries
+
+
+def day_relpath(day: date) -> str:
+    """Return the path of *day*'s journal page, relative to the root."""
+    return day.strftime(JOURNAL_DIR + "/%Y/%m/%d.md")
+
+
+def week_range(year: int, week: int) -> Tuple[date, date]:
+    """Return the first and last days of ISO week *week* of *year*."""
+    january_4th = date(year, 1, 4)
+    start = january_4th - timedelta(days=january_4th.isoweekday() - 1)
+    start += timedelta(weeks=week - 1)
+    return start, start + timedelta(days=6)
+
+
+class JournalIndex:
+    """A persisted day -> "Done" entries index of the journal pages."""
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, content_root: str, index_path: Optional[str] = None):
+        """
+        Create a new index.
+
+        :param content_root: the content root the journal pages are in
+        :param index_path: where the index is persisted. If None, it is
+                           kept in memory only.
+        """
+        self.content_root = content_root
+        self.index_path = index_path
+        # "YYYY-MM-DD" -> [mtime_ns, size, entries]
+        self._days = {}  # type: Dict[str, list]
+        self._lock = Lock()
+        self._load()
+
+    def _load(self):
+        if self.index_path is None or not exists(self.index_path):
+            return
+        try:
+            with open(self.index_path) as index_file:
+                data = json.load(index_file)
+        except ValueError:
+            logger.warning("Ignoring corrupted index %s", self.index_path)
+            return
+        if data.get("version") == self.FORMAT_VERSION:
+            self._days = data["days"]
+
+    def _save(self):
+        if self.index_path is None:
+            return
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w+") as index_file:
+            json.dump(
+                {"version": self.FORMAT_VERSION, "days": self._days},
+                index_file,
+            )
+        os.replace(tmp_path, self.index_path)
+
+    def _index_day(self, key: str, path: str, markdown=None) -> bool:
+        """Bring the entry of day *key* up to date. Tell if it changed."""
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            return self._days.pop(key, None) is not None
+        signature = [stat_result.st_mtime_ns, stat_result.st_size]
+        entry = self._days.get(key)
+        if entry is not None and entry[:2] == signature and markdown is None:
+            return False
+        if markdown is None:
+            with open(path) as markdown_file:
+                markdown = markdown_file.read()
+        self._days[key] = signature + [done_entries(markdown)]
+        return True
+
+    def refresh(self, path: str, markdown: Optional[str] = None):
+        """
+        Update the index after *path* changed, if it is a journal page.
+
+        :param path: the changed file, absolute or relative to the root
+        :param markdown: the file's new content, if known
+        """
+        relpath = os.path.relpath(
+            pjoin(self.content_root, path), self.content_root
+        ).replace(os.sep, "/")
+        match = DAY_PATH_RE.match(relpath)
+        if not match:
+            return
+        with self._lock:
+            if self._index_day(
+                "-".join(match.groups()),
+                pjoin(self.content_root, relpath),
+                markdown,
+            ):
+                self._save()
+
+    def _sync_year(self, year: int) -> bool:
+        """Index the year's new or changed pages. Tell if any changed."""
+        changed = False
+        seen = set()
+        year_dir = pjoin(self.content_root, JOURNAL_DIR, "{:04}".format(year))
+        if exists(year_dir):
+            for month in sorted(os.listdir(year_dir)):
+                month_dir = pjoin(year_dir, month)
+                if not re.match(r"^\d{2}$", month) or not os.path.isdir(
+                    month_dir
+                ):
+                    continue
+                for fname in os.listdir(month_dir):
+                    match = re.match(r"^(\d{2})\.md$", fname)
+                    if not match:
+                        continue
+                    key = "{:04}-{}-{}".format(year, month, match.group(1))
+                    seen.add(key)
+                    changed |= self._index_day(key, pjoin(month_dir, fname))
+        prefix = "{:04}-".format(year)
+        for key in [k for k in self._days if k.startswith(prefix)]:
+            if key not in seen:
+                del self._days[key]
+                changed = True
+        return changed
+
+    def rollup(self, start: date, end: date) -> List[Dict[str, object]]:
+        """
+        Return the "Done" entries of the days from *start* to *end*.
+
+        :return: a list of {"date", "path", "done"} dictionaries, oldest
+                 first, for the days having a journal page
+        """
+        with self._lock:
+            changed = False
+            for year in range(start.year, end.year + 1):
+                changed |= self._sync_year(year)
+            if changed:
+                self._save()
+            first, last = start.isoformat(), end.isoformat()
+            return [
+                {
+                    "date": key,
+                    "path": JOURNAL_DIR + "/" + key.replace("-", "/"),
+                    "done": list(self._days[key][2]),
+                }
+                for key in sorted(self._days)
+                if first <= key <= last
+            ]
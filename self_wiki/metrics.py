@@ -0,0 +1,265 @@
+"""
+Lightweight instrumentation of self.wiki's hot paths.
+
+Timers, counters and histograms are only recorded when metrics are enabled
+(see the SELF_WIKI_METRICS environment variable). When disabled, each
+instrumentation point costs a single attribute lookup.
+"""
+import os
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock, local
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: Optional[Labels] = None) -> str:
+    pairs = tuple(labels) + tuple(extra or ())
+    if not pairs:
+        return ""
+    return (
+        "{"
+        + ",".join(
+            '{}="{}"'.format(
+                k, str(v).replace("\\", "\\\\").replace('"', '\\"')
+            )
+            for k, v in pairs
+        )
+        + "}"
+    )
+
+
+class _NullTimer:
+    """A reusable context manager doing nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Histogram:
+    """Cumulative histogram, as understood by prometheus."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: Labels) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(
+                "{}_bucket{} {}".format(
+                    name,
+                    _format_labels(labels, (("le", repr(bound)),)),
+                    cumulative,
+                )
+            )
+        lines.append(
+            "{}_bucket{} {}".format(
+                name, _format_labels(labels, (("le", "+Inf"),)), self.count
+            )
+        )
+        lines.append(
+            "{}_sum{} {}".format(name, _format_labels(labels), self.sum)
+        )
+        lines.append(
+            "{}_count{} {}".format(name, _format_labels(labels), self.count)
+        )
+        return lines
+
+
+class Metrics:
+    """
+    A registry of counters, histograms and gauges.
+
+    Stage timings are also accumulated per thread, for the request being
+    served, so they can be exposed as a Server-Timing header.
+    """
+
+    STAGE_METRIC = "self_wiki_stage_duration_seconds"
+    REQUEST_METRIC = "self_wiki_request_duration_seconds"
+
+    def __init__(self, enabled: bool = False):
+        """Create a new, empty, registry."""
+        self.enabled = enabled
+        self._lock = Lock()
+        self._counters = {}  # type: Dict[Tuple[str, Labels], float]
+        self._histograms = {}  # type: Dict[Tuple[str, Labels], _Histogram]
+        self._gauges = {}  # type: Dict[str, Callable[[], float]]
+        self._help = {}  # type: Dict[str, str]
+        self._local = local()
+
+    def describe(self, name: str, text: str):
+        """Set the HELP text of metric *name*."""
+        self._help[name] = text
+
+    def incr(self, name: str, value: float = 1, **labels):
+        """Increment counter *name* by *value*."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record *value* in histogram *name*."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def gauge(self, name: str, callback: Callable[[], float]):
+        """Register a gauge, whose value is computed by *callback*."""
+        self._gauges[name] = callback
+
+    def timer(self, stage: str):
+        """Return a context manager timing *stage*."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._timer(stage)
+
+    def timed(self, stage: str):
+        """Decorate a function so that its calls are timed as *stage*."""
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self._timer(stage):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    @contextmanager
+    def _timer(self, stage: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            self.observe(self.STAGE_METRIC, elapsed, stage=stage)
+            stages = getattr(self._local, "stages", None)
+            if stages is not None:
+                stages[stage] = stages.get(stage, 0.0) + elapsed
+
+    def start_request(self):
+        """Start accumulating stage timings for the current thread."""
+        if not self.enabled:
+            return
+        self._local.stages = {}
+        self._local.start = perf_counter()
+
+    def finish_request(self, endpoint: str) -> Dict[str, float]:
+        """
+        Stop accumulating stage timings for the current thread.
+
+        :return: the stage timings, in seconds, including the 'total' stage
+        """
+        stages = getattr(self._local, "stages", None)
+        if not self.enabled or stages is None:
+            return {}
+        self._local.stages = None
+        stages["total"] = perf_counter() - self._local.start
+        self.observe(
+            self.REQUEST_METRIC, stages["total"], endpoint=str(endpoint)
+        )
+        return stages
+
+    def render(self) -> str:
+        """Return every metric, in prometheus' text exposition format."""
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name in seen:
+                return
+            seen.add(name)
+            if name in self._help:
+                lines.append("# HELP {} {}".format(name, self._help[name]))
+            lines.append("# TYPE {} {}".format(name, kind))
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                self._histograms.items(), key=lambda item: item[0]
+            )
+            histograms = [(k, _copy(h)) for k, h in histograms]
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append("{}{} {}".format(name, _format_labels(labels), value))
+        for (name, labels), histogram in histograms:
+            header(name, "histogram")
+            lines.extend(histogram.lines(name, labels))
+        for name, callback in sorted(self._gauges.items()):
+            header(name, "gauge")
+            lines.append("{} {}".format(name, callback()))
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Forget every recorded value. Gauges are kept."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _copy(histogram: _Histogram) -> _Histogram:
+    copy = _Histogram(histogram.buckets)
+    copy.counts = list(histogram.counts)
+    copy.sum = histogram.sum
+    copy.count = histogram.count
+    return copy
+
+
+def server_timing(stages: Dict[str, float]) -> str:
+    """Format stage timings (in seconds) as a Server-Timing header value."""
+    return ", ".join(
+        "{};dur={:.3f}".format(stage, duration * 1000)
+        for stage, duration in stages.items()
+    )
+
+
+METRICS = Metrics(enabled=bool(os.environ.get("SELF_WIKI_METRICS", "")))
+METRICS.describe(
+    Metrics.STAGE_METRIC, "Time spent in each stage of self.wiki"
+)
+METRICS.describe(Metrics.REQUEST_METRIC, "Request latency, per endpoint")
@@ -0,0 +1,115 @@
+"""
+In-memory cache of page contents.
+
+Rendering a page also loads the pages listed in its sidebar, so the same few
+files are read over and over. PageCache keeps their decoded contents in
+memory, within a byte budget, and checks (inode, mtime, size) before serving
+them, so that edits made outside self.wiki are still picked up.
+"""
+import locale
+import logging
+import mmap
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Tuple
+
+from self_wiki.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+Signature = Tuple[int, int, int]
+
+
+def _signature(stat_result: os.stat_result) -> Signature:
+    return (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+
+
+class PageCache:
+    """A byte-bounded LRU cache of text files, validated against os.stat."""
+
+    DEFAULT_BUDGET = 32 * 1024 * 1024
+
+    def __init__(self, budget: int = DEFAULT_BUDGET, mmap_threshold: int = 0):
+        """
+        Create a new, empty, cache.
+
+        :param budget: maximum size of the cached files, in bytes. Files
+                       bigger than a quarter of it are never cached.
+        :param mmap_threshold: files of at least this size, in bytes, are
+                               read through mmap(2). 0 disables it.
+        """
+        self._budget = budget
+        self._mmap_threshold = mmap_threshold
+        self._entries = OrderedDict()  # type: OrderedDict
+        self._used = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def used(self) -> int:
+        """Return the size of the cached files, in bytes."""
+        return self._used
+
+    def read(self, path: str) -> str:
+        r"""
+        Return the content of the file at *path*.
+
+        Like open(path).read(), newlines are translated to "\n".
+
+        :raise OSError: if the file can't be read, FileNotFoundError if it
+                        does not exist
+        """
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            self.forget(path)
+            raise
+        signature = _signature(stat_result)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                METRICS.incr("self_wiki_page_cache_total", result="hit")
+                return entry[1]
+            self.misses += 1
+        METRICS.incr("self_wiki_page_cache_total", result="miss")
+        text = self._read(path, stat_result.st_size)
+        if stat_result.st_size <= self._budget // 4:
+            with self._lock:
+                self._discard(path)
+                self._entries[path] = (signature, text)
+                self._used += stat_result.st_size
+                while self._used > self._budget:
+                    self._discard(next(iter(self._entries)))
+        return text
+
+    def _read(self, path: str, size: int) -> str:
+        if not self._mmap_threshold or size < self._mmap_threshold:
+            with open(path, "r") as text_file:
+                return text_file.read()
+        logger.debug("Reading %s (%d bytes) through mmap", path, size)
+        with open(path, "rb") as binary_file:
+            with mmap.mmap(
+                binary_file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mapped:
+                text = str(mapped, locale.getpreferredencoding(False))
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
+
+    def _discard(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._used -= entry[0][2]
+
+    def forget(self, path: str = None):
+        """Forget about *path*, or about every file if None."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._used = 0
+            else:
+                self._discard(path)
@@ -0,0 +1,148 @@
+"""
+On-demand profiling of individual requests.
+
+Profiling is enabled by setting SELF_WIKI_PROFILE to a secret token. A request
+carrying that token, either in the X-Self-Wiki-Profile header or in the
+'profile' query argument, is run under cProfile. The resulting stats are
+written in SELF_WIKI_PROFILE_DIR, along with a small JSON file describing the
+request.
+"""
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+from datetime import datetime
+from hmac import compare_digest
+from io import StringIO
+from os.path import exists, join as pjoin
+from tempfile import gettempdir
+from threading import Lock
+from time import perf_counter
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Self-Wiki-Profile"
+PROFILE_ARG = "profile"
+
+
+class RequestProfiler:
+    """Profile requests carrying the right token, one at a time."""
+
+    def __init__(self, token: str = "", directory: str = ""):
+        """
+        Create a new profiler.
+
+        :param token: the token requests should carry. Profiling is disabled
+                      if empty.
+        :param directory: where profiles are written.
+        """
+        self.token = token
+        self.directory = directory or pjoin(
+            gettempdir(), "self.wiki-profiles"
+        )
+        # only one profiler may be active at a time, at least since 3.12
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Tell if profiling may happen at all."""
+        return bool(self.token)
+
+    def wants(self, headers, args) -> bool:
+        """Tell if a request, given its headers and args, wants a profile."""
+        if not self.token:
+            return False
+        given = headers.get(PROFILE_HEADER) or args.get(PROFILE_ARG)
+        return given is not None and compare_digest(
+            given.encode("utf-8"), self.token.encode("utf-8")
+        )
+
+    def start(self) -> Optional["ProfileSession"]:
+        """
+        Start profiling the current thread.
+
+        :return: None if another request is already being profiled
+        """
+        if not self._lock.acquire(blocking=False):
+            logger.info("Already profiling a request, not profiling this one")
+            return None
+        try:
+            return ProfileSession(self, self._lock)
+        except ValueError:  # another profiler is active, since 3.12
+            self._lock.release()
+            logger.warning("Another profiler is active, not profiling")
+            return None
+
+
+class ProfileSession:
+    """A running profile of a single request."""
+
+    def __init__(self, profiler: RequestProfiler, lock: Lock):
+        """Start profiling. *lock* is released once stopped."""
+        self._profiler = profiler
+        self._lock = lock
+        self._profile = cProfile.Profile()
+        self._start = perf_counter()
+        self._profile.enable()
+
+    def stop(
+        self,
+        method: str,
+        url_path: str,
+        page_path: Optional[str] = None,
+        content_size: Optional[int] = None,
+        status: Optional[int] = None,
+    ) -> str:
+        """
+        Stop profiling, and write the results to disk.
+
+        :return: the path to the written .pstats file
+        """
+        self._profile.disable()
+        self._lock.release()
+        duration = perf_counter() - self._start
+        directory = self._profiler.directory
+        if not exists(directory):
+            os.makedirs(directory)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", url_path.strip("/")) or "index"
+        base = pjoin(
+            directory,
+            "{}-{}-{}".format(
+                datetime.now().strftime("%Y%m%dT%H%M%S.%f"), method, slug
+            ),
+        )
+        self._profile.dump_stats(base + ".pstats")
+        summary = StringIO()
+        stats = pstats.Stats(self._profile, stream=summary)
+        stats.sort_stats("cumulative").print_stats(40)
+        with open(base + ".txt", "w+") as summary_file:
+            summary_file.write(summary.getvalue())
+        with open(base + ".json", "w+") as info_file:
+            json.dump(
+                {
+                    "method": method,
+                    "url": url_path,
+                    "page": page_path,
+                    "content_size": content_size,
+                    "status": status,
+                    "duration": duration,
+                },
+                info_file,
+            )
+        logger.info(
+            "Profiled %s %s in %.3fs, written to %s.pstats",
+            method,
+            url_path,
+            duration,
+            base,
+        )
+        return base + ".pstats"
+
+
+PROFILER = RequestProfiler(
+    token=os.environ.get("SELF_WIKI_PROFILE", ""),
+    directory=os.environ.get("SELF_WIKI_PROFILE_DIR", ""),
+)
@@ -0,0 +1,235 @@
+"""
+Incremental markdown rendering.
+
+A page is split into top-level markdown blocks, and each block's HTML is
+memoized by the hash of its source. Re-rendering a page after an edit only
+converts the blocks that actually changed.
+"""
+import logging
+import re
+from collections import OrderedDict
+from hashlib import sha1
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from markdown import Markdown
+
+logger = logging.getLogger(__name__)
+
+MD_EXTS = [
+    "extra",
+    "admonition",
+    "codehilite",
+    "meta",
+    "sane_lists",
+    "smarty",
+    "toc",
+    "wikilinks",
+]
+
+Meta = Dict[str, List[str]]
+
+FENCE_RE = re.compile(r"^(~{3,}|`{3,})")
+LIST_RE = re.compile(r"^ {0,3}([*+-]|\d+\.)[ \t]+")
+DEFINITION_RE = re.compile(r"^ {0,3}:[ \t]", re.MULTILINE)
+HEADER_ID_RE = re.compile(r'(<h[1-6][^>]*? id=")([^"]*)(")')
+IDCOUNT_RE = re.compile(r"^(.*)_([0-9]+)$")
+# Features whose output depends on more than one block: footnotes,
+# reference-style links, abbreviations, the [TOC] marker and raw HTML
+# blocks (which may span blank lines).
+GLOBAL_FEATURES_RE = re.compile(
+    r"\[\^|^ {0,3}\[[^\]]+\]:|^\*\[|^\[TOC\][ \t]*$|^<[A-Za-z!/]",
+    re.MULTILINE,
+)
+
+
+def split_blocks(markdown: str) -> List[str]:
+    """
+    Split a markdown document in top-level blocks.
+
+    Blocks are separated by blank lines, except when said blank lines are
+    part of a fenced code block, or when the following chunk continues the
+    previous one (indented content, list items, blockquotes, definitions).
+    """
+    chunks = []  # type: List[List[str]]
+    current = []  # type: List[str]
+    fence = None  # type: Optional[str]
+    for line in markdown.replace("\r\n", "\n").split("\n"):
+        if fence is not None:
+            current.append(line)
+            if line.rstrip() == fence:
+                fence = None
+            continue
+        match = FENCE_RE.match(line)
+        if match:
+            fence = match.group(1)
+            current.append(line)
+            continue
+        if not line.strip():
+            if current:
+                chunks.append(current)
+                current = []
+            continue
+        current.append(line)
+    if current:
+        chunks.append(current)
+
+    blocks = []  # type: List[str]
+    for i, chunk in enumerate(chunks):
+        first = chunk[0]
+        text = "\n".join(chunk)
+        following = chunks[i + 1][0] if i + 1 < len(chunks) else ""
+        if blocks and (
+            _continues(blocks[-1], first)
+            or _adds_term(blocks[-1], text, following)
+        ):
+            blocks[-1] = blocks[-1] + "\n\n" + text
+        else:
+            blocks.append(text)
+    return blocks
+
+
+def _continues(previous: str, first_line: str) -> bool:
+    """Tell if a chunk starting with *first_line* extends *previous*."""
+    if first_line[:1] in (" ", "\t", ":"):
+        return True
+    if LIST_RE.match(first_line) and LIST_RE.match(previous):
+        return True
+    return first_line.startswith(">") and previous.startswith(">")
+
+
+def _adds_term(previous: str, text: str, following: str) -> bool:
+    """
+    Tell if chunk *text* is a new term of the definition list *previous*.
+
+    That is the case when the term's definition is in the chunk itself, or
+    in the chunk after it, starting with *following*.
+    """
+    if not DEFINITION_RE.search(previous):
+        return False
+    return bool(DEFINITION_RE.search(text) or DEFINITION_RE.match(following))
+
+
+def _dedupe_header_ids(fragments: List[str]) -> List[str]:
+    """
+    Make header ids unique across independently rendered fragments.
+
+    Mimics what the toc extension does on a whole document.
+    """
+    used = set()
+
+    def _unique(match):
+        header_id = match.group(2)
+        while header_id in used or not header_id:
+            m = IDCOUNT_RE.match(header_id)
+            if m:
+                header_id = "%s_%d" % (m.group(1), int(m.group(2)) + 1)
+            else:
+                header_id = "%s_%d" % (header_id, 1)
+        used.add(header_id)
+        return match.group(1) + header_id + match.group(3)
+
+    return [HEADER_ID_RE.sub(_unique, f) for f in fragments]
+
+
+class BlockRenderer:
+    """
+    Render markdown documents, memoizing the HTML of each top-level block.
+
+    Documents using features that span several blocks (see
+    GLOBAL_FEATURES_RE) are rendered as a whole, and cached as such.
+    """
+
+    DEFAULT_CACHE_SIZE = 4096
+
+    def __init__(
+        self,
+        extensions: Optional[List[str]] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ):
+        """
+        Create a new renderer.
+
+        :param extensions: markdown extensions to use. Defaults to MD_EXTS.
+        :param cache_size: maximum number of memoized blocks.
+        """
+        if extensions is None:
+            extensions = MD_EXTS
+        self._converter = Markdown(
+            extensions=extensions, output_format="html5"
+        )
+        # 'meta' would eat any "Key: value" paragraph rendered on its own,
+        # so only the first block of a document goes through it.
+        self._block_converter = Markdown(
+            extensions=[e for e in extensions if e != "meta"],
+            output_format="html5",
+        )
+        self._cache = OrderedDict()  # type: OrderedDict
+        self._cache_size = cache_size
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, markdown: str) -> Tuple[str, Meta]:
+        """
+        Render *markdown* to HTML.
+
+        :return: a tuple (html, meta), meta being the document's metadata
+        """
+        if GLOBAL_FEATURES_RE.search(markdown):
+            html, meta = self._render(markdown, self._converter, "doc")
+            return html, _copy_meta(meta)
+        blocks = split_blocks(markdown)
+        if not blocks:
+            return "", {}
+        fragments = []
+        html, meta = self._render(blocks[0], self._converter, "first")
+        fragments.append(html)
+        for block in blocks[1:]:
+            fragments.append(
+                self._render(block, self._block_converter, "block")[0]
+            )
+        fragments = _dedupe_header_ids([f for f in fragments if f])
+        return "\n".join(fragments), _copy_meta(meta)
+
+    def clear(self):
+        """Forget every memoized block."""
+        with self._lock:
+            self._cache.clear()
+
+    def entries(self) -> list:
+        """Return the memoized blocks, as a list of (key, value) pairs."""
+        with self._lock:
+            return list(self._cache.items())
+
+    def update(self, entries: list):
+        """Memoize blocks, as returned by another renderer's entries()."""
+        with self._lock:
+            for key, value in entries:
+                self._cache[key] = value
+                self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def _render(
+        self, source: str, converter: Markdown, kind: str
+    ) -> Tuple[str, Meta]:
+        key = (kind, sha1(source.encode("utf-8")).digest())
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+            converter.reset()
+            html = converter.convert(source)
+            meta = getattr(converter, "Meta", {})
+            self._cache[key] = (html, meta)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return html, meta
+
+
+def _copy_meta(meta: Meta) -> Meta:
+    return {k: list(v) for k, v in meta.items()}
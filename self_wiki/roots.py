@@ -0,0 +1,131 @@
+"""
+Support for serving several content roots from a single process.
+
+Each ContentRoot holds what used to be module-level singletons (recent
+files, todo list, git repository, ...). RootDispatcher picks the content
+root of each request, either from a URL prefix or from the Host header.
+Page renders and file stats are cached process-wide, whatever the root.
+"""
+import logging
+import os
+from os.path import exists, expanduser, join as pjoin
+from typing import Dict
+
+from git import Repo
+
+from markupsafe import Markup
+
+from self_wiki import wiki
+from self_wiki.attachments import AttachmentStore
+from self_wiki.history import HistoryIndex
+from self_wiki.journal import JournalIndex
+from self_wiki.todo import TodoList
+from self_wiki.wiki import RecentFileManager
+
+logger = logging.getLogger(__name__)
+
+ENVIRON_KEY = "self_wiki.root"
+
+
+class ContentRoot:
+    """A content root, and the state attached to it."""
+
+    def __init__(self, name: str, path: str, repository=None):
+        """
+        Load a content root, creating its directory if needed.
+
+        :param name: the name the root is mounted as. "" for the default one.
+        :param path: path to the content root on disk
+        :param repository: the root's git.Repo, if already opened. Otherwise,
+                           it is opened if path contains a .git directory.
+        """
+        self.name = name
+        self.path = path
+        if not exists(path):
+            os.makedirs(path)
+        if repository is None and exists(pjoin(path, ".git")):
+            repository = Repo(path)
+            logger.info("Git integration is enabled for %s", path)
+        self.repository = repository
+        wiki.repositories[path] = repository
+        self.recent_files = RecentFileManager(path, limit=None)
+        self.todo_list = TodoList(pjoin(path, "todos.json"))
+        self.attachments = AttachmentStore(path)
+        self.history = (
+            HistoryIndex(
+                repository, pjoin(repository.git_dir, "self-wiki-history.json")
+            )
+            if repository is not None
+            else None
+        )
+        index_dir = path
+        if self.history is not None:
+            self.history.start()
+            index_dir = repository.git_dir
+        self.journal = JournalIndex(
+            path, pjoin(index_dir, ".self-wiki-journal.json")
+        )
+        self.recent_sidebar = (None, Markup(""))
+
+
+def parse_roots(spec: str) -> Dict[str, str]:
+    """
+    Parse a content roots specification.
+
+    :param spec: a list of name=path pairs, separated by ';'
+    :return: a dictionary mapping names to paths
+    """
+    roots = {}
+    for item in spec.split(";"):
+        if not item.strip():
+            continue
+        name, sep, path = item.partition("=")
+        if not sep or not name.strip() or not path.strip():
+            raise ValueError("Invalid content root: {!r}".format(item))
+        path = expanduser(path.strip())
+        if not path.endswith(os.sep):
+            path = path + os.sep
+        roots[name.strip()] = path
+    return roots
+
+
+class RootDispatcher:
+    """
+    WSGI middleware selecting the content root of each request.
+
+    With prefix mounting, /<name>/some/page is served from content root
+    <name> as /some/page, with SCRIPT_NAME set accordingly. With host
+    mounting, the Host header is matched against the roots' names. Other
+    requests go to the default content root.
+    """
+
+    def __init__(
+        self,
+        wsgi_app,
+        default: ContentRoot,
+        roots: Dict[str, ContentRoot],
+        by_host: bool = False,
+    ):
+        """Wrap *wsgi_app*."""
+        self.wsgi_app = wsgi_app
+        self.default = default
+        self.roots = roots
+        self.by_host = by_host
+
+    def __call__(self, environ, start_response):
+        """Select the content root, then call the wrapped application."""
+        root = self.default
+        if self.by_host:
+            host = environ.get("HTTP_HOST", "").rsplit(":", 1)[0].lower()
+            root = self.roots.get(host, self.default)
+        else:
+            path_info = environ.get("PATH_INFO", "")
+            name, _, rest = path_info.lstrip("/").partition("/")
+            if name in self.roots:
+                root = self.roots[name]
+                environ["SCRIPT_NAME"] = (
+                    environ.get("SCRIPT_NAME", "").rstrip("/") + "/" + name
+                )
+                environ["PATH_INFO"] = "/" + rest
+        environ[ENVIRON_KEY] = root
+        return self.wsgi_app(environ, start_response)
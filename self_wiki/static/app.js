@@ -1,10 +1,11 @@
-var SELF_WIKI = {};
+// base is the URL prefix of the content root, set by base.html.j2
+var SELF_WIKI = {base: ''};
 
 function sendFile() {
     const input = document.getElementById('file-input');
     const formData = new FormData();
     for (let i = 0; i < input.files.length; i++) {
-        formData.append('file', input.files[i], input.files[i].filename);
+        formData.append('file', input.files[i], input.files[i].name);
     }
     const xhr = new XMLHttpRequest();
     xhr.open('POST', window.location.toString() + '/upload');
@@ -25,7 +26,7 @@ Mousetrap.bind('ctrl+c n', function (e) {
                 console.log(`${text} created`);
             }
         };
-        xhr.open('post', '/todo');
+        xhr.open('post', SELF_WIKI.base + '/todo');
         xhr.setRequestHeader("Content-Type", "application/json");
         xhr.send(JSON.stringify({'text': text, 'done': false}));
     }
@@ -36,7 +37,7 @@ Mousetrap.bind('ctrl+c d', function (e) {
     if (confirm('Really delete this page?')) {
         let xhr = new XMLHttpRequest();
         xhr.onload = function() {
-            window.location.pathname = '/'
+            window.location.pathname = SELF_WIKI.base + '/'
         };
         xhr.open('delete', window.location.toString());
         xhr.setRequestHeader("Content-Type", "application/json");
@@ -44,9 +45,26 @@ Mousetrap.bind('ctrl+c d', function (e) {
     }
 });
 
+Mousetrap.bind('ctrl+c m', function (e) {
+    let current = window.location.pathname.slice(SELF_WIKI.base.length);
+    let target = prompt('Move this page and its children to', current);
+    if (target && target !== current) {
+        let xhr = new XMLHttpRequest();
+        xhr.onload = function () {
+            if (xhr.status === 201)
+                window.location.pathname = SELF_WIKI.base + '/' + target.replace(/^\/+/, '');
+            else
+                alert(xhr.responseText);
+        };
+        xhr.open('post', window.location.toString() + '/move');
+        xhr.setRequestHeader("Content-Type", "application/json");
+        xhr.send(JSON.stringify({'to': target, 'links': true}));
+    }
+});
+
 function delTodo(id) {
     let xhr = new XMLHttpRequest();
-    xhr.open('delete', '/todo');
+    xhr.open('delete', SELF_WIKI.base + '/todo');
     xhr.setRequestHeader("Content-Type", "application/json");
     xhr.send(JSON.stringify({'id': id}));
     document.getElementById('todo_' + id).parentElement.remove();
@@ -59,38 +77,117 @@ function toggleTodoDone(id) {
     else
         todo.className = 'notdone';
     let xhr = new XMLHttpRequest();
-    xhr.open('put', '/todo');
+    xhr.open('put', SELF_WIKI.base + '/todo');
     xhr.setRequestHeader("Content-Type", "application/json");
     xhr.send(JSON.stringify({'id': id, 'done': todo.className === "done"}));
 }
 
-function getTodoList() {
+function todoItem(todo) {
+    let item = document.createElement('li');
+    let button = document.createElement('button');
+    button.className = 'button';
+    button.textContent = 'del';
+    button.onclick = function () {
+        delTodo(todo.id);
+    };
+    let text = document.createElement('span');
+    text.id = 'todo_' + todo.id;
+    text.className = todo.done ? 'done' : 'notdone';
+    text.textContent = todo.text;
+    text.onclick = function () {
+        toggleTodoDone(todo.id);
+    };
+    item.appendChild(button);
+    item.appendChild(text);
+    return item;
+}
+
+// Todos are fetched SELF_WIKI.todoPageSize at a time: "more" fetches the
+// next page, from the cursor returned along with the last one
+SELF_WIKI.todoPageSize = 50;
+SELF_WIKI.todoPages = 1;
+
+function getTodoPage(cursor, callback) {
     let xhr = new XMLHttpRequest();
     xhr.onreadystatechange = function () {
-        if (xhr.readyState === XMLHttpRequest.DONE && xhr.status === 200) {
-            let list = document.getElementById('todoList');
-            list.innerHTML = '';
-            JSON.parse(xhr.responseText).forEach(function (todo) {
-                list.innerHTML += `<li><button class="button" onclick="delTodo(${todo.id})">del</button>
-<span id="todo_${todo.id}" class="${todo.done ? 'done' : 'notdone'}" onclick="toggleTodoDone(${todo.id})">${todo.text}</span></li>`;
-            });
-        }
+        if (xhr.readyState === XMLHttpRequest.DONE && xhr.status === 200)
+            callback(JSON.parse(xhr.responseText));
     };
-    xhr.open('get', '/todo');
+    let url = SELF_WIKI.base + '/todo?limit=' + SELF_WIKI.todoPageSize;
+    if (cursor)
+        url += '&cursor=' + encodeURIComponent(cursor);
+    xhr.open('get', url);
     xhr.setRequestHeader("Content-Type", "application/json");
     xhr.send();
 }
 
-function saveCurrentPage(editor) {
+function appendTodoPage(list, page, last) {
+    let items = document.createDocumentFragment();
+    page.todos.forEach(function (todo) {
+        items.appendChild(todoItem(todo));
+    });
+    if (last && page.next) {
+        let more = document.createElement('li');
+        let button = document.createElement('button');
+        button.className = 'button button-outline';
+        button.textContent = 'more';
+        button.onclick = function () {
+            getTodoPage(page.next, function (nextPage) {
+                more.remove();
+                SELF_WIKI.todoPages += 1;
+                appendTodoPage(list, nextPage, true);
+            });
+        };
+        more.appendChild(button);
+        items.appendChild(more);
+    }
+    list.appendChild(items);
+}
+
+function getTodoList() {
+    // refresh the pages currently shown
+    let pages = [];
+    let collect = function (page) {
+        pages.push(page);
+        if (page.next && pages.length < SELF_WIKI.todoPages) {
+            getTodoPage(page.next, collect);
+            return;
+        }
+        let list = document.getElementById('todoList');
+        list.innerHTML = '';
+        pages.forEach(function (shown, i) {
+            appendTodoPage(list, shown, i === pages.length - 1);
+        });
+        SELF_WIKI.todoPages = pages.length;
+    };
+    getTodoPage(null, collect);
+}
+
+function saveCurrentPage(editor, autosave) {
+    let markdown = editor.value();
+    // idle editors don't need to send the same content again and again
+    if (autosave && markdown === SELF_WIKI.lastSaved)
+        return;
     let xhr = new XMLHttpRequest();
     xhr.onreadystatechange = function () {
         if (xhr.readyState === XMLHttpRequest.DONE && xhr.status === 201) {
+            SELF_WIKI.lastSaved = markdown;
             console.log("Saved current page");
         }
     };
     xhr.open('put', window.location.toString() + '/save');
     xhr.setRequestHeader("Content-Type", "application/json");
-    xhr.send(JSON.stringify({'markdown': editor.value()}));
+    xhr.send(JSON.stringify({'markdown': markdown, 'autosave': !!autosave}));
+}
+
+function flushCurrentPage(editor) {
+    // explicit save when leaving the editor, so that it reaches the disk
+    fetch(window.location.toString() + '/save', {
+        method: 'PUT',
+        keepalive: true,
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify({'markdown': editor.value(), 'autosave': false})
+    });
 }
 
 function setPageList(datalist) {
@@ -99,11 +196,11 @@ function setPageList(datalist) {
         datalist.innerHTML = '';
         JSON.parse(xhr.responseText).forEach(function (data) {
             let option = document.createElement('option');
-            option.value = data.path.slice(0, -3);
+            option.value = data.path.replace(/^\/+/, '').slice(0, -3);
             datalist.appendChild(option);
         });
     };
-    xhr.open('get', '/search');
+    xhr.open('get', SELF_WIKI.base + '/search');
     xhr.send();
 
 }
@@ -111,6 +208,11 @@ function setPageList(datalist) {
 function init() {
     // generate accesskeys
     keykeeper();
+    // exported pages have no API to talk to
+    if (SELF_WIKI.readOnly) {
+        Mousetrap.reset();
+        return;
+    }
     // get todolist, then set periodicity
     getTodoList();
     SELF_WIKI.todoThread = setInterval(getTodoList, 10000);
@@ -0,0 +1,246 @@
+"""
+Operations on a page together with its child pages.
+
+A page path/to/page is stored as path/to/page.md, and its child pages (and
+attachments) under path/to/page/. Moving or deleting it renames (or
+removes) the page and its directory at once, then updates the content
+root's indexes in a single pass, and makes a single git commit.
+"""
+import logging
+import os
+import re
+import shutil
+from os.path import dirname, exists, isdir, join as pjoin
+from typing import Dict, List
+
+from self_wiki.attachments import replace_file
+from self_wiki.metrics import METRICS
+from self_wiki.wiki import Page
+
+logger = logging.getLogger(__name__)
+
+WIKILINK_RE = re.compile(r"\[\[([\w0-9_ -]+)\]\]")
+INLINE_LINK_RE = re.compile(r"(\]\(\s*<?)(/[^)\s>]*)")
+REFERENCE_LINK_RE = re.compile(
+    r"^( {0,3}\[[^\]]+\]:[ \t]*<?)(/\S*?)(>?(?:[ \t].*)?)$", re.MULTILINE
+)
+
+
+class SubtreeError(Exception):
+    """Raised when a subtree operation can't be applied."""
+
+    def __init__(self, message: str, status: int = 400):
+        """Create a new error, with the matching HTTP *status*."""
+        super().__init__(message)
+        self.status = status
+
+
+def _page_name(path: str) -> str:
+    path = path.strip("/")
+    if path.endswith(".md"):
+        path = path[:-3]
+    if not path or path == "index":
+        raise SubtreeError("The root page can't be moved or deleted")
+    if any(part in ("", ".", "..") for part in path.split("/")):
+        raise SubtreeError("Invalid page path: {!r}".format(path))
+    return path
+
+
+def subtree_files(content_root: str, page: str) -> List[str]:
+    """
+    Return the files of *page* and of its child pages.
+
+    :param page: the page path, without .md
+    :return: paths relative to *content_root*
+    """
+    files = []
+    if exists(pjoin(content_root, page + ".md")):
+        files.append(page + ".md")
+    directory = pjoin(content_root, page)
+    if isdir(directory):
+        for path, dirnames, filenames in os.walk(directory):
+            dirnames.sort()
+            for fname in sorted(filenames):
+                files.append(
+                    os.path.relpath(pjoin(path, fname), content_root).replace(
+                        os.sep, "/"
+                    )
+                )
+    return files
+
+
+def _moved(url: str, source: str, target: str) -> str:
+    """Return *url* pointing to the moved page, or *url* if not affected."""
+    for suffix in ("", ".md"):
+        prefix = "/" + source + suffix
+        if url == prefix or url.startswith(prefix + "/"):
+            return "/" + target + suffix + url[len(prefix) :]  # noqa
+        for separator in ("#", "?"):
+            if url.startswith(prefix + separator):
+                return "/" + target + suffix + url[len(prefix) :]  # noqa
+    return url
+
+
+def rewrite_links(markdown: str, source: str, target: str) -> str:
+    """
+    Make the links to page *source* (and its children) point to *target*.
+
+    Absolute inline and reference links are rewritten, as well as
+    [[wikilinks]]. A wikilink can't point to a child page, so it is turned
+    into an inline link if *target* is one.
+    """
+
+    def inline(match):
+        return match.group(1) + _moved(match.group(2), source, target)
+
+    def reference(match):
+        return (
+            match.group(1)
+            + _moved(match.group(2), source, target)
+            + match.group(3)
+        )
+
+    def wikilink(match):
+        label = match.group(1)
+        if label.strip().replace(" ", "_") != source:
+            return match.group(0)
+        if WIKILINK_RE.match("[[" + target + "]]"):
+            return "[[" + target + "]]"
+        return "[{}](/{})".format(label, target)
+
+    markdown = INLINE_LINK_RE.sub(inline, markdown)
+    markdown = REFERENCE_LINK_RE.sub(reference, markdown)
+    return WIKILINK_RE.sub(wikilink, markdown)
+
+
+def _commit(repository, pathspecs: List[str], message: str):
+    with METRICS.timer("git"):
+        tracked = [
+            p
+            for p in pathspecs
+            if exists(pjoin(repository.working_tree_dir, p))
+            or repository.git.ls_files("--", p)
+        ]
+        if not tracked:
+            return
+        repository.git.add("-A", "--", *tracked)
+        if repository.is_dirty(index=True, working_tree=False):
+            repository.index.commit(message=message)
+
+
+def _forget_caches(content_root: str, relpaths: List[str]):
+    for relpath in relpaths:
+        Page.content_cache.forget(pjoin(content_root, relpath))
+
+
+def _rewrite_page(path: str, source: str, target: str) -> bool:
+    """
+    Rewrite the links to *source* in page *path*. Tell if it changed.
+
+    A buffered autosave of the page is merged: its links are rewritten, and
+    it is written instead of the file's content.
+    """
+    buffered = None
+    if Page.write_buffer is not None:
+        buffered = Page.write_buffer.get(path)
+    markdown = buffered
+    if markdown is None:
+        try:
+            markdown = Page.content_cache.read(path)
+        except FileNotFoundError:
+            return False
+    if source not in markdown and source.replace("_", " ") not in markdown:
+        return False
+    new_markdown = rewrite_links(markdown, source, target)
+    if new_markdown == markdown:
+        return False
+    replace_file(path, new_markdown)
+    Page.content_cache.forget(path)
+    if buffered is not None:
+        Page.write_buffer.take(path)
+    return True
+
+
+def move(root, source: str, target: str, links: bool = False) -> Dict:
+    """
+    Move page *source*, with its child pages, to *target*.
+
+    :param root: the ContentRoot the pages are in
+    :param source: the page to move, as an URL path
+    :param target: its new path, as an URL path
+    :param links: rewrite the links to the moved pages in every page
+    :return: a dictionary with the "moved" (old -> new) files, and the
+             pages whose links were "rewritten"
+    :raise SubtreeError: if the move is not possible
+    """
+    source, target = _page_name(source), _page_name(target)
+    if target == source or target.startswith(source + "/"):
+        raise SubtreeError("Can't move a page into itself", 409)
+    files = subtree_files(root.path, source)
+    if not files:
+        raise SubtreeError("No such page: {}".format(source), 404)
+    if subtree_files(root.path, target):
+        raise SubtreeError("Page {} already exists".format(target), 409)
+    moved = {old: target + old[len(source) :] for old in files}  # noqa
+    os.makedirs(dirname(pjoin(root.path, target)), exist_ok=True)
+    for name in (source + ".md", source):
+        if exists(pjoin(root.path, name)):
+            os.rename(
+                pjoin(root.path, name),
+                pjoin(root.path, target + name[len(source) :]),  # noqa
+            )
+    _forget_caches(root.path, list(moved))
+    rewritten = []
+    if links:
+        moved_pages = set(moved.values())
+        for ref in root.recent_files.get():
+            relpath = moved.get(ref.relpath, ref.relpath)
+            if not relpath.endswith(".md"):
+                continue
+            path = pjoin(root.path, relpath)
+            with Page.writing(path):
+                changed = _rewrite_page(path, source, target)
+            if changed and relpath not in moved_pages:
+                rewritten.append(relpath)
+    root.recent_files.bulk_update(renamed=moved, touched=rewritten)
+    for relpath in list(moved) + list(moved.values()) + rewritten:
+        root.journal.refresh(relpath)
+    logger.info("Moved %d file(s) from %s to %s", len(moved), source, target)
+    if root.repository is not None:
+        _commit(
+            root.repository,
+            [source + ".md", source, target + ".md", target] + rewritten,
+            "Move {} to {}".format(source, target),
+        )
+    return {"moved": moved, "rewritten": rewritten}
+
+
+def delete(root, source: str) -> List[str]:
+    """
+    Delete page *source*, with its child pages.
+
+    :param root: the ContentRoot the pages are in
+    :param source: the page to delete, as an URL path
+    :return: the deleted files
+    :raise SubtreeError: if there is no such page
+    """
+    source = _page_name(source)
+    files = subtree_files(root.path, source)
+    if not files:
+        raise SubtreeError("No such page: {}".format(source), 404)
+    if exists(pjoin(root.path, source + ".md")):
+        os.remove(pjoin(root.path, source + ".md"))
+    if isdir(pjoin(root.path, source)):
+        shutil.rmtree(pjoin(root.path, source))
+    _forget_caches(root.path, files)
+    root.recent_files.bulk_update(deleted=files)
+    for relpath in files:
+        root.journal.refresh(relpath)
+    logger.info("Deleted %d file(s) under %s", len(files), source)
+    if root.repository is not None:
+        _commit(
+            root.repository,
+            [source + ".md", source],
+            "Delete {}".format(source),
+        )
+    return files
@@ -1,28 +1,164 @@
 """Models related to todos stuff."""
+import base64
+import binascii
 import json
+import logging
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from itertools import count
 from os.path import exists
+from typing import List, Optional, Set, Tuple
+
+from self_wiki.attachments import replace_file
+from self_wiki.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+TAG_RE = re.compile(r"(?:^|\s)#(\w[\w-]*)")
+ORDERS = ("id", "text", "due")
+
+
+def todo_tags(todo: dict) -> Set[str]:
+    """Return the tags of *todo*: its "tags" list, and #words in its text."""
+    tags = set(str(t).lower() for t in todo.get("tags") or [])
+    tags.update(t.lower() for t in TAG_RE.findall(_text(todo)))
+    return tags
+
+
+def _text(todo: dict) -> str:
+    text = todo.get("text")
+    return "" if text is None else str(text)
+
+
+def _comparable(value) -> tuple:
+    """
+    Return a key sorting *value* among values of any JSON type.
+
+    Numbers come first, then strings, then anything else, so that todos
+    loaded from a hand-edited file never compare, say, an int to a str.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value)
+    if isinstance(value, str):
+        return (1, value)
+    return (2, json.dumps(value, sort_keys=True))
+
+
+def _id_key(todo_id) -> tuple:
+    # the id itself comes last, for the keys to be mapped back to todos
+    return _comparable(todo_id) + (todo_id,)
+
+
+def _sort_key(todo: dict, order: str) -> tuple:
+    if order == "text":
+        return (_text(todo).casefold(),) + _id_key(todo["id"])
+    if order == "due":
+        # todos without a due date come last
+        due = todo.get("due")
+        if due:
+            return (0,) + _comparable(due) + _id_key(todo["id"])
+        return (1, 0, "") + _id_key(todo["id"])
+    return _id_key(todo["id"])
+
+
+def encode_cursor(key: tuple) -> str:
+    """Return an opaque pagination cursor, pointing after *key*."""
+    data = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor made by encode_cursor. Raise ValueError if invalid."""
+    try:
+        key = json.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        )
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Invalid cursor: {!r}".format(cursor))
+    if not isinstance(key, list):
+        raise ValueError("Invalid cursor: {!r}".format(cursor))
+    return tuple(key)
 
 
 class TodoList:
-    """A container for a collection of Todos."""
+    """
+    A container for a collection of Todos.
+
+    Besides the todos themselves, secondary indexes (by status, tag and due
+    date, and one sorted index per order) are maintained on each change, so
+    that query() does not need to scan the whole list.
+    """
 
     def __init__(self, serialization_path):
         """Create a new TodoList collection."""
-        self._todos = []
+        self._todos = OrderedDict()  # type: OrderedDict
         self._serialization_path = serialization_path
+        self._reset_indexes()
         self.load()
 
+    def _reset_indexes(self):
+        self._by_status = {True: set(), False: set()}  # type: dict
+        self._by_tag = {}  # type: dict
+        self._by_due = []  # type: List[tuple]
+        self._ordered = {o: [] for o in ORDERS}  # type: dict
+
+    def _index(self, todo: dict):
+        todo_id = todo["id"]
+        self._by_status[bool(todo.get("done"))].add(todo_id)
+        for tag in todo_tags(todo):
+            self._by_tag.setdefault(tag, set()).add(todo_id)
+        if todo.get("due"):
+            insort(self._by_due, _comparable(todo["due"]) + _id_key(todo_id))
+        for order, index in self._ordered.items():
+            insort(index, _sort_key(todo, order))
+
+    def _unindex(self, todo: dict):
+        todo_id = todo["id"]
+        self._by_status[bool(todo.get("done"))].discard(todo_id)
+        for tag in todo_tags(todo):
+            ids = self._by_tag.get(tag)
+            if ids is not None:
+                ids.discard(todo_id)
+                if not ids:
+                    del self._by_tag[tag]
+        if todo.get("due"):
+            _remove(self._by_due, _comparable(todo["due"]) + _id_key(todo_id))
+        for order, index in self._ordered.items():
+            _remove(index, _sort_key(todo, order))
+
+    @METRICS.timed("todo_load")
     def load(self):
         """Load a serialized collection from disk."""
         if not exists(self._serialization_path):
             return
         with open(self._serialization_path) as todo_file:
-            self._todos = json.load(todo_file)
+            todos = json.load(todo_file)
+        self._todos = OrderedDict()
+        self._reset_indexes()
+        without_id = []
+        for todo in todos:
+            if not isinstance(todo, dict) or isinstance(
+                todo.get("id"), (list, dict)
+            ):
+                logger.warning("Ignoring invalid todo: %r", todo)
+            elif "id" not in todo:
+                without_id.append(todo)
+            else:
+                previous = self._todos.get(todo["id"])
+                if previous is not None:
+                    self._unindex(previous)
+                self._index(todo)
+                self._todos[todo["id"]] = todo
+        for todo in without_id:
+            todo["id"] = self._get_next_available_id()
+            self._index(todo)
+            self._todos[todo["id"]] = todo
 
+    @METRICS.timed("todo_save")
     def save(self):
         """Persist current collection on disk."""
-        with open(self._serialization_path, "w+") as f:
-            json.dump(self.todos, f)
+        replace_file(self._serialization_path, json.dumps(self.todos))
 
     def from_json(self, j: dict):
         """
@@ -34,27 +170,140 @@ class TodoList:
         """
         if "id" not in j.keys():
             j["id"] = self._get_next_available_id()
+        already_existing = self._todos.get(j["id"])
+        if already_existing is not None:
+            self._unindex(already_existing)
+            already_existing.update(j)
+            self._index(already_existing)
         else:
-            already_existing = list(
-                filter(lambda x: x["id"] == j["id"], self._todos)
-            )
-            if already_existing is not None and already_existing != []:
-                already_existing[0].update(j)
-                return
-        self._todos.append(j)
+            self._index(j)
+            self._todos[j["id"]] = j
         self.save()
 
+    def get(self, todo_id: int) -> Optional[dict]:
+        """Return the todo whose id is *todo_id*, if any."""
+        return self._todos.get(todo_id)
+
+    def delete(self, todo_id: int) -> Optional[dict]:
+        """
+        Delete a todo, and persist the collection.
+
+        :return: the deleted todo, or None if there is no such todo
+        """
+        todo = self._todos.pop(todo_id, None)
+        if todo is not None:
+            self._unindex(todo)
+            self.save()
+        return todo
+
     @property
-    def todos(self):
+    def todos(self) -> List[dict]:
+        """Return the todos, in insertion order."""
+        return list(self._todos.values())
+
+    def query(
+        self,
+        done: Optional[bool] = None,
+        prefix: Optional[str] = None,
+        due_after: Optional[str] = None,
+        due_before: Optional[str] = None,
+        tag: Optional[str] = None,
+        order: str = "id",
+        reverse: bool = False,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
         """
-        Return the internal object list.
+        Return a page of todos matching every given criterion.
 
-        Why not rename self._todos to self.todos? No idea.
+        :param done: only return done (True) or not done (False) todos
+        :param prefix: only return todos whose text starts with this,
+                       ignoring case
+        :param due_after: only return todos due on or after this ISO date
+        :param due_before: only return todos due on or before this ISO date
+        :param tag: only return todos with this tag. See todo_tags.
+        :param order: one of ORDERS
+        :param reverse: sort in descending order
+        :param limit: maximum number of todos to return
+        :param cursor: the cursor returned along with the previous page
+        :return: a tuple (todos, cursor). cursor is None on the last page.
+        :raise ValueError: on an invalid order or cursor
         """
-        return self._todos
+        if order not in ORDERS:
+            raise ValueError("Invalid order: {!r}".format(order))
+        candidates = self._candidates(done, prefix, due_after, due_before, tag)
+        index = self._ordered[order]
+        if candidates is not None and len(candidates) < len(index) // 8:
+            # cheaper to sort the few candidates than to filter the index
+            index = sorted(
+                _sort_key(self._todos[i], order) for i in candidates
+            )
+            candidates = None
+        try:
+            if reverse:
+                start = len(index)
+                if cursor is not None:
+                    start = bisect_left(index, decode_cursor(cursor))
+                keys = (index[i] for i in range(start - 1, -1, -1))
+            else:
+                start = 0
+                if cursor is not None:
+                    start = bisect_right(index, decode_cursor(cursor))
+                keys = (index[i] for i in range(start, len(index)))
+        except TypeError:  # a cursor made for another order
+            raise ValueError("Invalid cursor: {!r}".format(cursor))
+        page = []  # type: List[tuple]
+        for key in keys:
+            if candidates is None or key[-1] in candidates:
+                if len(page) == limit:
+                    return (
+                        [self._todos[k[-1]] for k in page],
+                        encode_cursor(page[-1]),
+                    )
+                page.append(key)
+        return [self._todos[k[-1]] for k in page], None
+
+    def _candidates(
+        self, done, prefix, due_after, due_before, tag
+    ) -> Optional[Set[int]]:
+        """Intersect the indexes' answers. None means "every todo"."""
+        sets = []
+        if done is not None:
+            sets.append(self._by_status[bool(done)])
+        if tag is not None:
+            sets.append(self._by_tag.get(tag.lower(), set()))
+        if prefix:
+            prefix = prefix.casefold()
+            by_text = self._ordered["text"]
+            ids = set()
+            for i in range(bisect_left(by_text, (prefix,)), len(by_text)):
+                if not by_text[i][0].startswith(prefix):
+                    break
+                ids.add(by_text[i][-1])
+            sets.append(ids)
+        if due_after is not None or due_before is not None:
+            start = 0
+            if due_after is not None:
+                start = bisect_left(self._by_due, _comparable(due_after))
+            end = len(self._by_due)
+            if due_before is not None:
+                # inf sorts after any id, so that due_before is included
+                end = bisect_right(
+                    self._by_due, _comparable(due_before) + (float("inf"),)
+                )
+            sets.append(set(key[-1] for key in self._by_due[start:end]))
+        if not sets:
+            return None
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
 
     def _get_next_available_id(self):
-        current_ids_list = map(lambda x: x["id"], self._todos)
-        for i in range(0, 1024):  # totally arbitrary limit
-            if i not in current_ids_list:
+        for i in count():
+            if i not in self._todos:
                 return i
+
+
+def _remove(index: list, key: tuple):
+    position = bisect_left(index, key)
+    if position < len(index) and index[position] == key:
+        del index[position]
@@ -1,33 +1,96 @@
 """Some useful classes and functions related to self.wiki."""
+import os
 import re
+from collections import OrderedDict
 from datetime import date
+from threading import Lock
+from time import monotonic
+from typing import Optional
 
 from self_wiki.wiki import Page
 
 
-def write_todo_to_journal(basepath: str, todo: dict):
+def write_todo_to_journal(
+    basepath: str, todo: dict, journal=None, day: Optional[date] = None
+):
     """
     Write the object to a Page, denoted as journal in the URL.
 
     The given item should have the following keys: 'id', 'text'
+
+    :param basepath: the content root
+    :param journal: a JournalIndex to keep up to date, if any
+    :param day: the journal's day. Defaults to today.
     """
-    p = Page(basepath, date.today().strftime("journal/%Y/%m/%d"))
-    # load existing
-    p.load()
-    if p.markdown == "":
-        # we are freeeee
-        p.markdown = """# journal du {d}
+    if day is None:
+        day = date.today()
+    p = Page(day.strftime("journal/%Y/%m/%d"), root=basepath, shallow=True)
+    # an autosave of the journal may be buffered: append to it, and write it
+    # along, so that it does not overwrite the todo once flushed
+    with Page.writing(p.path):
+        p.load()
+        if p.markdown == "":
+            # we are freeeee
+            p.markdown = """# journal du {d}
 
 ## Done
 
 * {id}: {text}
 """.format(
-            d=date.today().strftime("%Y/%m/%d"), **todo
-        )
+                d=day.strftime("%Y/%m/%d"), **todo
+            )
+        else:
+            match = re.search(r"^#+ *Done\n+", p.markdown, re.MULTILINE)
+            if not match:
+                p.markdown = p.markdown.rstrip("\n") + "\n\n## Done\n\n"
+            elif not p.markdown.endswith("\n"):
+                p.markdown = p.markdown + "\n"
+            p.markdown = p.markdown + "* {id}: {text}\n".format(**todo)
         p.save()
-        return
-    match = re.match(r"#+ *Done\n+", p.markdown)
-    if not match:
-        p.markdown = p.markdown + "\n\n## Done\n\n"
-    p.markdown = p.markdown + "* {id}: {text}\n".format(**todo)
-    p.save()
+        if Page.write_buffer is not None:
+            Page.write_buffer.take(p.path)
+    if journal is not None:
+        journal.refresh(p.path, p.markdown)
+
+
+class StatCache:
+    """
+    A small LRU cache of os.stat results.
+
+    Entries expire after *ttl* seconds, and may be forgotten explicitly when
+    self.wiki itself changes a file. Missing files are cached too, as None.
+    """
+
+    def __init__(self, ttl: float = 2.0, size: int = 1024):
+        """Create a new, empty, cache."""
+        self._ttl = ttl
+        self._size = size
+        self._entries = OrderedDict()  # type: OrderedDict
+        self._lock = Lock()
+
+    def stat(self, path: str) -> Optional[os.stat_result]:
+        """Return the stat result of *path*, or None if it does not exist."""
+        now = monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(path)
+                return entry[1]
+        try:
+            result = os.stat(path)  # type: Optional[os.stat_result]
+        except OSError:
+            result = None
+        with self._lock:
+            self._entries[path] = (now + self._ttl, result)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+        return result
+
+    def forget(self, path: Optional[str] = None):
+        """Forget about *path*, or about every path if None."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
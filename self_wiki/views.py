@@ -1,68 +1,395 @@
 """Contains the flask views and their related objects."""
 import logging
+import mimetypes
 import os
-from os.path import basename, dirname, exists, isdir, join as pjoin
+from datetime import date, timedelta
+from os.path import basename, dirname, exists, isdir, join as pjoin, relpath
+from stat import S_ISREG
+from urllib.parse import quote
 
 from flask import (
+    Response,
+    abort,
+    g,
     jsonify,
     redirect,
     render_template,
     request,
+    send_file,
     send_from_directory,
 )
 from flask.views import MethodView
 
+from markupsafe import Markup
+
+from werkzeug.formparser import parse_form_data
+from werkzeug.security import safe_join
+
 from self_wiki import CONTENT_ROOT, app, repository
-from self_wiki.todo import TodoList
-from self_wiki.utils import write_todo_to_journal
-from self_wiki.wiki import Page, RecentFileManager
+from self_wiki import compression, subtree
+from self_wiki.attachments import is_reserved
+from self_wiki.autosave import WriteBehindBuffer
+from self_wiki.journal import week_range
+from self_wiki.metrics import METRICS, server_timing
+from self_wiki.profiling import PROFILER
+from self_wiki.roots import (
+    ContentRoot,
+    ENVIRON_KEY,
+    RootDispatcher,
+    parse_roots,
+)
+from self_wiki.utils import StatCache, write_todo_to_journal
+from self_wiki.warmup import WarmUp
+from self_wiki.wiki import Page
 
 logger = logging.getLogger(__name__)
 
-RECENT_FILES = RecentFileManager(CONTENT_ROOT, limit=None)
-TODO_LIST = TodoList(pjoin(CONTENT_ROOT, "todos.json"))
+DEFAULT_ROOT = ContentRoot("", CONTENT_ROOT, repository=repository)
+# Additional content roots, as "name=path;other=path", mounted either by
+# URL prefix (/name/...) or by host name (SELF_WIKI_MOUNT=host)
+ROOTS = {
+    name: ContentRoot(name, path)
+    for name, path in parse_roots(
+        os.environ.get("SELF_WIKI_CONTENT_ROOTS", "")
+    ).items()
+}
+if ROOTS:
+    app.wsgi_app = RootDispatcher(
+        app.wsgi_app,
+        DEFAULT_ROOT,
+        ROOTS,
+        by_host=os.environ.get("SELF_WIKI_MOUNT", "").lower() == "host",
+    )
+# The default content root's objects
+RECENT_FILES = DEFAULT_ROOT.recent_files
+TODO_LIST = DEFAULT_ROOT.todo_list
 
 FAVICON_PATH = os.environ.get("SELF_WIKI_FAVICON_PATH", "")
 TITLE_PREFIX = os.environ.get("SELF_WIKI_TITLE_PREFIX", "") or "self.wiki "
 if TITLE_PREFIX[-1] != " ":
     TITLE_PREFIX = TITLE_PREFIX + " "
 
+COMPRESS = os.environ.get("SELF_WIKI_COMPRESS", "1") not in ("", "0")
+COMPRESS_LEVEL = int(os.environ.get("SELF_WIKI_COMPRESS_LEVEL", "") or 6)
+COMPRESS_MIN_SIZE = int(
+    os.environ.get("SELF_WIKI_COMPRESS_MIN_SIZE", "") or 1024
+)
+STATIC_ASSETS = compression.StaticPrecompressor(
+    app.static_folder, os.environ.get("SELF_WIKI_COMPRESS_CACHE", "")
+)
+# Either "" (disabled), "all", or the number of recent pages to pre-render
+WARMUP = os.environ.get("SELF_WIKI_WARMUP", "").lower()
+WARMUP_JOBS = int(
+    os.environ.get("SELF_WIKI_WARMUP_JOBS", "")
+    or max(1, (os.cpu_count() or 2) // 2)
+)
+WARMUP_SECONDS = float(os.environ.get("SELF_WIKI_WARMUP_SECONDS", "") or 60)
+# Either "", "x-sendfile" or "x-accel-redirect"
+SENDFILE = os.environ.get("SELF_WIKI_SENDFILE", "").lower()
+ACCEL_REDIRECT_PREFIX = (
+    os.environ.get("SELF_WIKI_ACCEL_REDIRECT_PREFIX", "") or "/_attachments/"
+)
+if SENDFILE == "x-sendfile":
+    app.config["USE_X_SENDFILE"] = True
+ATTACHMENT_STATS = StatCache()
+
+RECENT_SIDEBAR_LENGTH = 9
+
+
+def _write_page(path: str, markdown: str, root: ContentRoot):
+    """Write a page to disk, and update the indexes of its content root."""
+    try:
+        if Page.content_cache.read(path) == markdown:
+            return
+    except FileNotFoundError:
+        pass
+    page_to_save = Page(path, root.path, shallow=True)
+    page_to_save.markdown = markdown
+    page_to_save.save()
+    root.recent_files.update(page_to_save.path)
+    root.journal.refresh(page_to_save.path, markdown)
+    ATTACHMENT_STATS.forget(page_to_save.path)
+
+
+# Autosaves are written at most every SELF_WIKI_AUTOSAVE_DELAY seconds
+AUTOSAVES = WriteBehindBuffer(
+    _write_page,
+    delay=float(os.environ.get("SELF_WIKI_AUTOSAVE_DELAY", "") or 60),
+)
+Page.write_buffer = AUTOSAVES
+
+
+def all_roots():
+    """Return every content root served by this process."""
+    return [DEFAULT_ROOT] + list(ROOTS.values())
+
+
+def current_root() -> ContentRoot:
+    """Return the content root of the request being served."""
+    return request.environ.get(ENVIRON_KEY, DEFAULT_ROOT)
+
+
+def recent_sidebar(root: ContentRoot = None) -> Markup:
+    """
+    Return the "Recent" sidebar HTML fragment of *root*.
+
+    The fragment is only rendered again when the root's recent files change,
+    which includes any page saved through self.wiki (and thus title changes).
+
+    :param root: the content root. Defaults to the current request's.
+    """
+    if root is None:
+        root = current_root()
+    version, html = root.recent_sidebar
+    if version == root.recent_files.version:
+        METRICS.incr("self_wiki_sidebar_cache_total", result="hit")
+        return html
+    METRICS.incr("self_wiki_sidebar_cache_total", result="miss")
+    version = root.recent_files.version
+    html = Markup(
+        render_template(
+            "recent.html.j2",
+            recent=root.recent_files.get(RECENT_SIDEBAR_LENGTH),
+        )
+    )
+    root.recent_sidebar = (version, html)
+    return html
+
+
+def _warm_recent_sidebars():
+    with app.app_context():
+        for root in all_roots():
+            recent_sidebar(root)
+
+
+if WARMUP:
+    # a single pool for every root: the render cache is shared anyway
+    WarmUp(
+        Page.renderer,
+        [
+            ref.path
+            for root in all_roots()
+            for ref in root.recent_files.get(
+                None if WARMUP == "all" else int(WARMUP)
+            )
+        ],
+        jobs=WARMUP_JOBS,
+        time_budget=WARMUP_SECONDS,
+        on_done=_warm_recent_sidebars,
+    ).start()
+
+
+METRICS.gauge("self_wiki_render_cache_hits", lambda: Page.renderer.hits)
+METRICS.gauge("self_wiki_render_cache_misses", lambda: Page.renderer.misses)
+METRICS.gauge("self_wiki_page_cache_bytes", lambda: Page.content_cache.used)
+METRICS.gauge("self_wiki_buffered_autosaves", lambda: len(AUTOSAVES))
+METRICS.gauge(
+    "self_wiki_recent_files",
+    lambda: sum(len(r.recent_files.get()) for r in all_roots()),
+)
+METRICS.gauge(
+    "self_wiki_todos", lambda: sum(len(r.todo_list.todos) for r in all_roots())
+)
+
+
+@app.before_request
+def _start_request_metrics():
+    METRICS.start_request()
+
+
+@app.after_request
+def _finish_request_metrics(response):
+    stages = METRICS.finish_request(request.endpoint)
+    if stages:
+        response.headers["Server-Timing"] = server_timing(stages)
+    return response
+
+
+@app.before_request
+def _send_precompressed_static():
+    if not COMPRESS or request.endpoint != "static":
+        return None
+    encoding = compression.negotiate(
+        request.headers.get("Accept-Encoding", "")
+    )
+    if encoding is None:
+        return None
+    filename = request.view_args["filename"]
+    path = STATIC_ASSETS.path_for(filename, encoding)
+    if path is None:
+        return None
+    response = send_file(
+        path,
+        mimetype=mimetypes.guess_type(filename)[0],
+        conditional=True,
+    )
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@app.after_request
+def _compress_response(response):
+    if (
+        not COMPRESS
+        or response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or not compression.is_compressible(response.mimetype)
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = compression.negotiate(
+        request.headers.get("Accept-Encoding", "")
+    )
+    if encoding is None:
+        return response
+    response.set_data(compression.compress(data, encoding, COMPRESS_LEVEL))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+@app.before_request
+def _start_profile():
+    if PROFILER.enabled and PROFILER.wants(request.headers, request.args):
+        session = PROFILER.start()
+        if session is not None:
+            g.profile = session
+
+
+def _stop_profile(status):
+    session = g.pop("profile", None)
+    if session is None:
+        return
+    page_path = (request.view_args or {}).get("path")
+    content_size = None
+    if page_path is not None:
+        for candidate in (page_path, page_path + ".md"):
+            candidate = pjoin(current_root().path, candidate)
+            if exists(candidate) and not isdir(candidate):
+                content_size = os.stat(candidate).st_size
+                break
+    session.stop(
+        request.method,
+        request.path,
+        page_path=page_path,
+        content_size=content_size,
+        status=status,
+    )
+
+
+@app.after_request
+def _finish_profile(response):
+    _stop_profile(response.status_code)
+    return response
+
+
+@app.teardown_request
+def _abort_profile(_exception):
+    _stop_profile(500)
+
+
+@app.route("/metrics")
+def metrics():
+    """Expose metrics in prometheus' text format, if enabled."""
+    if not METRICS.enabled:
+        abort(404)
+    return Response(
+        METRICS.render(), mimetype="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+TODO_QUERY_ARGS = (
+    "done",
+    "prefix",
+    "due_after",
+    "due_before",
+    "tag",
+    "order",
+    "desc",
+    "limit",
+    "cursor",
+)
+TODO_PAGE_SIZE = 50
+TODO_MAX_PAGE_SIZE = 500
+
+
+def _flag(value: str) -> bool:
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise ValueError("Invalid boolean: {!r}".format(value))
+
 
 class TodoView(MethodView):
     """Flask View to emulate a simple REST API."""
 
     methods = ["GET", "POST", "PUT", "DELETE"]
 
-    def get(self):  # noqa: D102
-        return jsonify(TODO_LIST.todos)
+    def get(self):
+        """
+        Return the todos.
+
+        Without arguments, the whole list is returned. Otherwise, a page of
+        at most *limit* todos matching the done, prefix, due_after,
+        due_before and tag arguments is returned, sorted by *order* (id,
+        text or due), along with the cursor of the next page. See
+        TodoList.query.
+        """
+        todo_list = current_root().todo_list
+        if not any(arg in request.args for arg in TODO_QUERY_ARGS):
+            return jsonify(todo_list.todos)
+        args = request.args
+        try:
+            todos, cursor = todo_list.query(
+                done=_flag(args["done"]) if "done" in args else None,
+                prefix=args.get("prefix"),
+                due_after=args.get("due_after"),
+                due_before=args.get("due_before"),
+                tag=args.get("tag"),
+                order=args.get("order", "id"),
+                reverse=_flag(args.get("desc", "0")),
+                limit=max(
+                    1,
+                    min(
+                        TODO_MAX_PAGE_SIZE,
+                        int(args.get("limit", TODO_PAGE_SIZE)),
+                    ),
+                ),
+                cursor=args.get("cursor") or None,
+            )
+        except ValueError as e:
+            return str(e), 400
+        return jsonify(todos=todos, next=cursor)
 
     def post(self):  # noqa: D102
         if not request.is_json:
             return "Expected json", 400
-        TODO_LIST.from_json(request.json)
+        current_root().todo_list.from_json(request.json)
         return "Created", 201
 
     def put(self):  # noqa: D102
         if not request.is_json:
             return "Expected json", 400
-        TODO_LIST.from_json(request.json)
+        current_root().todo_list.from_json(request.json)
         return "Updated", 201
 
     def delete(self):  # noqa: D102
         if not request.is_json:
             return "Expected json", 400
-        for i in range(0, len(TODO_LIST.todos)):
-            if request.json["id"] == TODO_LIST.todos[i]["id"]:
-                # let's move the item to the day's journal
-                if (
-                    "done" in TODO_LIST.todos[i].keys()
-                    and TODO_LIST.todos[i]["done"]
-                ):
-                    write_todo_to_journal(CONTENT_ROOT, TODO_LIST.todos[i])
-                del TODO_LIST.todos[i]
-                TODO_LIST.save()
-                return "OK", 200
-        return "Could not find specified element", 404
+        root = current_root()
+        todo = root.todo_list.delete(request.json["id"])
+        if todo is None:
+            return "Could not find specified element", 404
+        # let's move the item to the day's journal
+        if todo.get("done"):
+            write_todo_to_journal(root.path, todo, journal=root.journal)
+        return "OK", 200
 
 
 app.add_url_rule("/todo", view_func=TodoView.as_view(name="todo"))
@@ -84,14 +411,12 @@ def search():
     """
     limit = request.args.get("up_to", default=None, type=int)
     logger.debug("search request with args %s", request.args)
-    res = RECENT_FILES.get(limit)
-    results = []
-    for e in res:
-        d = {}
-        d.update(e)
-        d["path"] = e["path"][len(CONTENT_ROOT) :]  # noqa
-        results.append(d)
-    return jsonify(results)
+    return jsonify(
+        [
+            {"path": "/" + ref.relpath, "mtime": ref.mtime}
+            for ref in current_root().recent_files.get(limit)
+        ]
+    )
 
 
 @app.route("/edit/save", defaults={"path": "index"}, methods=["PUT"])
@@ -100,50 +425,198 @@ def save(path):  # noqa: D103
     if not request.is_json:
         return 401
     markdown = request.json["markdown"]
-    page_to_save = Page(path, CONTENT_ROOT)
-    page_to_save.markdown = markdown
-    page_to_save.save()
-    RECENT_FILES.update(page_to_save.path)
+    root = current_root()
+    page_path = Page(path, root.path, shallow=True).path
+    if request.json.get("autosave"):
+        AUTOSAVES.autosave(page_path, markdown, root)
+    else:
+        AUTOSAVES.save(page_path, markdown, root)
     return "OK", 201
 
 
 @app.route("/edit/upload", defaults={"path": "index"}, methods=["POST"])
 @app.route("/<path:path>/edit/upload", methods=["POST"])
 def upload(path):  # noqa: D103
-    if "file" not in request.files:
+    # Files are streamed to the attachment store while being hashed, instead
+    # of being buffered by werkzeug and copied afterwards.
+    root = current_root()
+    spooled = []
+
+    def stream_factory(*args, **kwargs):
+        spooled.append(root.attachments.stream_factory(*args, **kwargs))
+        return spooled[-1]
+
+    try:
+        return _store_uploads(path, root, stream_factory)
+    finally:
+        # parts that were not stored: other fields, or a failed request
+        for spool in spooled:
+            spool.discard()
+
+
+def _store_uploads(path: str, root: ContentRoot, stream_factory):
+    _, _, files = parse_form_data(
+        request.environ,
+        stream_factory=stream_factory,
+        max_content_length=app.config.get("MAX_CONTENT_LENGTH"),
+    )
+    uploads = files.getlist("file")
+    if not uploads:
         return "Error: no files in request", 400
-    file = request.files["file"]
-    if file.filename == "":
+    if any(basename(f.filename or "") == "" for f in uploads):
         return "Error: Empty file name", 400
-    if file:
-        if path == "index":
-            path = ""
-        file.save(pjoin(CONTENT_ROOT, dirname(path), file.filename))
-        if repository is not None:
-            logger.info("Adding file %s to git", file.filename)
-            repository.index.add([file.filename])
-            repository.index.commit(message="Add {}".format(file.filename))
-        return jsonify(message="OK", path=pjoin("/", path, file.filename)), 201
+    if any(basename(f.filename) in (".", "..") for f in uploads):
+        return "Error: Invalid file name", 400
+    if any(is_reserved(basename(f.filename)) for f in uploads):
+        return "Error: pages and todos.json can't be uploaded", 400
+    if path == "index":
+        path = ""
+    changed, paths = [], []
+    for f in uploads:
+        filename = basename(f.filename)
+        target = pjoin(root.path, dirname(path), filename)
+        if root.attachments.add(f.stream, target):
+            changed.append(target)
+        ATTACHMENT_STATS.forget(target)
+        paths.append(pjoin("/", dirname(path), filename))
+    repo = root.repository
+    if repo is not None and changed:
+        logger.info("Adding %d file(s) to git", len(changed))
+        with METRICS.timer("git"):
+            repo.index.add([relpath(t, root.path) for t in changed])
+            repo.index.commit(
+                message="Add {}".format(
+                    ", ".join(basename(t) for t in changed)
+                )
+            )
+    return jsonify(message="OK", path=paths[0], paths=paths), 201
+
+
+@app.route("/<path:path>/move", methods=["POST"])
+def move(path):
+    """
+    Move a page, along with its child pages, to the "to" JSON key's path.
+
+    If the "links" JSON key is true, links to the moved pages are rewritten
+    in every page.
+    """
+    if not request.is_json or not request.json.get("to"):
+        return "Expected json, with a 'to' key", 400
+    AUTOSAVES.flush_all()
+    try:
+        result = subtree.move(
+            current_root(),
+            path,
+            request.json["to"],
+            links=bool(request.json.get("links")),
+        )
+    except subtree.SubtreeError as e:
+        return str(e), e.status
+    ATTACHMENT_STATS.forget()
+    return jsonify(result), 201
 
 
 @app.route("/", defaults={"path": "index"}, methods=["DELETE"])
 @app.route("/<path:path>", methods=["DELETE"])
-def delete(path):  # noqa: D103
-    p = Page(path, CONTENT_ROOT)
+def delete(path):
+    """
+    Delete a page.
+
+    With a subtree=1 argument, its child pages are deleted too.
+    """
+    root = current_root()
+    if request.args.get("subtree", "") not in ("", "0"):
+        AUTOSAVES.flush_all()
+        try:
+            files = subtree.delete(root, path)
+        except subtree.SubtreeError as e:
+            return str(e), e.status
+        ATTACHMENT_STATS.forget()
+        return jsonify(deleted=files), 201
+    repo = root.repository
+    p = Page(path, root.path)
+    AUTOSAVES.discard(p.path)
     try:
         os.remove(p.path)
-        RECENT_FILES.delete(p.path)
-        if repository is not None:
+        root.recent_files.delete(p.path)
+        root.journal.refresh(p.path)
+        ATTACHMENT_STATS.forget(p.path)
+        if repo is not None:
             logger.info("Deleting page %s from git", p.title)
-            repository.index.add([p.path])
-            repository.index.commit(message="Delete {}".format(p.path))
+            with METRICS.timer("git"):
+                repo.index.add([p.path])
+                repo.index.commit(message="Delete {}".format(p.path))
         return "OK", 201
     except OSError as e:
-        if repository is not None:
-            repository.index.remove(p.path)
+        if repo is not None:
+            repo.index.remove(p.path)
         return "Could not delete page: " + str(e), 404
 
 
+@app.route("/journal/<int:year>")
+@app.route("/journal/<int:year>/<int:month>")
+@app.route("/journal/<int:year>/w<int:week>")
+def journal(year, month=None, week=None):
+    """
+    Return the "Done" entries of the journal pages of a year, month or week.
+
+    Weeks are ISO weeks, as in /journal/2024/w07.
+    """
+    try:
+        if week is not None:
+            if not 1 <= week <= 53:
+                raise ValueError(week)
+            start, end = week_range(year, week)
+        elif month is not None:
+            start = date(year, month, 1)
+            end = date(year + month // 12, month % 12 + 1, 1)
+            end -= timedelta(days=1)
+        else:
+            start, end = date(year, 1, 1), date(year, 12, 31)
+    except (OverflowError, ValueError):
+        return "Invalid date", 404
+    days = current_root().journal.rollup(start, end)
+    return jsonify(
+        start=start.isoformat(),
+        end=end.isoformat(),
+        count=sum(len(d["done"]) for d in days),
+        days=days,
+    )
+
+
+@app.route("/history", defaults={"path": "index"})
+@app.route("/<path:path>/history")
+def history(path):
+    """Return the list of commits that changed a page, most recent first."""
+    root = current_root()
+    if root.history is None:
+        return "Git integration is disabled", 404
+    page_relpath = Page(path, root.path, shallow=True).relpath
+    return jsonify(root.history.history(page_relpath))
+
+
+@app.route("/at/<rev>", defaults={"path": "index"})
+@app.route("/<path:path>/at/<rev>")
+def page_at(path, rev):
+    """Show a page as it was at git revision *rev*."""
+    root = current_root()
+    if root.history is None:
+        return "Git integration is disabled", 404
+    page_to_view = Page(path, root=root.path, shallow=True)
+    markdown = root.history.read(page_to_view.relpath, rev)
+    if markdown is None:
+        return "No such page at revision {}".format(rev), 404
+    page_to_view.markdown = markdown.decode("utf-8")
+    page_to_view.meta = None
+    return render_template(
+        "page.html.j2",
+        favicon=FAVICON_PATH,
+        title_prefix=TITLE_PREFIX,
+        page=page_to_view,
+        recent=recent_sidebar(),
+    )
+
+
 @app.route("/edit", defaults={"path": "index"})
 @app.route("/<path:path>/edit")
 def edit(path):  # noqa: D103
@@ -152,25 +625,49 @@ def edit(path):  # noqa: D103
         "edit.html.j2",
         favicon=FAVICON_PATH,
         title_prefix=TITLE_PREFIX,
-        page=Page(path, CONTENT_ROOT),
-        recent=(Page(f["path"], CONTENT_ROOT) for f in RECENT_FILES.get(9)),
+        page=Page(path, current_root().path),
+        recent=recent_sidebar(),
     )
 
 
+def send_attachment(path: str):
+    """
+    Send the file at *path*, relative to the current content root.
+
+    Range and conditional requests are honored. Unless SELF_WIKI_SENDFILE
+    delegates the transfer to a front proxy, the file is handed over to the
+    WSGI server's file wrapper, which may use sendfile(2).
+    """
+    root = current_root()
+    full_path = safe_join(root.path, path)
+    if full_path is None:
+        abort(404)
+    path = relpath(full_path, root.path).replace(os.sep, "/")
+    if SENDFILE == "x-accel-redirect":
+        response = Response(
+            mimetype=mimetypes.guess_type(path)[0]
+            or "application/octet-stream"
+        )
+        # one internal location per content root: <prefix><name>/
+        prefix = ACCEL_REDIRECT_PREFIX
+        if root.name:
+            prefix += root.name + "/"
+        response.headers["X-Accel-Redirect"] = prefix + quote(path)
+        return response
+    return send_from_directory(root.path, path, conditional=True)
+
+
 @app.route("/", defaults={"path": "index"})
 @app.route("/<path:path>")
 def page(path):  # noqa: D103
-    if (
-        not str(path).endswith("/")
-        and exists(pjoin(CONTENT_ROOT, path))
-        and not isdir(pjoin(CONTENT_ROOT, path))
-    ):
-        return send_from_directory(
-            pjoin(CONTENT_ROOT, dirname(path)), basename(path)
-        )
+    root = current_root()
+    if not str(path).endswith("/"):
+        stat_result = ATTACHMENT_STATS.stat(pjoin(root.path, path))
+        if stat_result is not None and S_ISREG(stat_result.st_mode):
+            return send_attachment(path)
     if str(path).endswith("/"):
         return redirect(path[:-1])
-    page_to_view = Page(path, root=CONTENT_ROOT, shallow=False)
+    page_to_view = Page(path, root=root.path, shallow=False)
     if page_to_view.markdown == "":
         return redirect(path + "/edit")
     return render_template(
@@ -178,7 +675,5 @@ def page(path):  # noqa: D103
         favicon=FAVICON_PATH,
         title_prefix=TITLE_PREFIX,
         page=page_to_view,
-        recent=(
-            Page(f["path"], root=CONTENT_ROOT) for f in RECENT_FILES.get(9)
-        ),
+        recent=recent_sidebar(),
     )
@@ -0,0 +1,114 @@
+"""
+Warm the render cache up, in the background.
+
+Pages are rendered by a pool of worker processes, which send the resulting
+blocks back to be memoized by the server's renderer. The server keeps
+accepting requests in the meantime.
+"""
+import logging
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from os.path import exists
+from threading import Thread
+from time import monotonic
+from typing import Callable, List, Optional
+
+from self_wiki.render import BlockRenderer
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 16
+
+
+def _render_batch(paths: List[str]) -> list:
+    """Render the pages at *paths*. Runs in a worker process."""
+    renderer = BlockRenderer()
+    for path in paths:
+        if not exists(path):
+            continue
+        with open(path, "r") as markdown_file:
+            renderer.render(markdown_file.read())
+    return renderer.entries()
+
+
+class WarmUp:
+    """Pre-render a list of pages, within CPU and time budgets."""
+
+    def __init__(
+        self,
+        renderer: BlockRenderer,
+        paths: List[str],
+        jobs: int = 1,
+        time_budget: float = 60.0,
+        on_done: Optional[Callable[[], None]] = None,
+    ):
+        """
+        Prepare a warm-up.
+
+        :param renderer: the renderer whose cache should be filled
+        :param paths: full paths to the pages to render, most important first
+        :param jobs: number of worker processes
+        :param time_budget: seconds after which remaining pages are skipped
+        :param on_done: called once every rendered block is memoized
+        """
+        self.renderer = renderer
+        self.paths = paths
+        self.jobs = max(1, jobs)
+        self.time_budget = time_budget
+        self.on_done = on_done
+
+    def run(self) -> int:
+        """
+        Render the pages, and fill the renderer's cache.
+
+        :return: the number of pages rendered
+        """
+        deadline = monotonic() + self.time_budget
+        batches = [
+            self.paths[i : i + BATCH_SIZE]  # noqa
+            for i in range(0, len(self.paths), BATCH_SIZE)
+        ]
+        pool = ProcessPoolExecutor(max_workers=self.jobs)
+        pending = {pool.submit(_render_batch, b): len(b) for b in batches}
+        rendered = 0
+        try:
+            while pending:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                done, _ = wait(
+                    pending, timeout=remaining, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    count = pending.pop(future)
+                    try:
+                        self.renderer.update(future.result())
+                        rendered += count
+                    except Exception:  # pylint: disable=W0703
+                        logger.exception("Could not pre-render pages")
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+        if pending:
+            logger.info(
+                "Warm-up time budget exhausted, skipped %d page(s)",
+                sum(pending.values()),
+            )
+        logger.info("Warm-up pre-rendered %d page(s)", rendered)
+        if self.on_done is not None:
+            self.on_done()
+        return rendered
+
+    def start(self) -> Optional[Thread]:
+        """
+        Run the warm-up in a background thread.
+
+        Does nothing from a worker process, where the module may be imported
+        again depending on the multiprocessing start method.
+        """
+        if multiprocessing.current_process().name != "MainProcess":
+            return None
+        thread = Thread(target=self.run, name="self.wiki warm-up", daemon=True)
+        thread.start()
+        return thread
@@ -4,26 +4,92 @@ Contains wiki-related stuff.
 For instance, :py:class:Page may be used to manipulate .md files on disk.
 """
 import logging
+import os
+import sys
+from contextlib import contextmanager
 from datetime import datetime
 from os import listdir, makedirs, stat, walk
 from os.path import dirname, exists, isdir, join as pjoin, sep as psep
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterable, List, Optional
 
-from markdown import Markdown
-
-MD_EXTS = [
-    "extra",
-    "admonition",
-    "codehilite",
-    "meta",
-    "sane_lists",
-    "smarty",
-    "toc",
-    "wikilinks",
-]
+from self_wiki.attachments import STORE_DIRNAME, replace_file
+from self_wiki.metrics import METRICS
+from self_wiki.pagecache import PageCache
+from self_wiki.render import BlockRenderer, MD_EXTS
 
 logger = logging.getLogger(__name__)
 repository = None
+# git repositories of the content roots, by root path. Roots missing from
+# this mapping use the module-wide repository.
+repositories = {}  # type: Dict[str, object]
+
+
+class PageRef:
+    """
+    A lightweight reference to a page, as used by listings.
+
+    Listings (recent files, search results, child pages) may hold a lot of
+    pages: a PageRef only keeps the page's path, interned and relative to
+    its content root, and its modification time. The title is computed on
+    demand.
+    """
+
+    __slots__ = ("root", "relpath", "mtime")
+
+    def __init__(self, root: str, relpath: str, mtime: float = 0.0):
+        """
+        Create a new page reference.
+
+        :param root: the page's content root
+        :param relpath: the page's path, relative to *root*
+        :param mtime: the page's modification time, as a UNIX timestamp
+        """
+        self.root = root
+        self.relpath = sys.intern(relpath)
+        self.mtime = mtime
+
+    @property
+    def path(self) -> str:
+        """Return the full path to the markdown document."""
+        return pjoin(self.root, self.relpath)
+
+    @property
+    def title(self) -> str:
+        """Return the title of the page. See Page.title."""
+        return Page(self.relpath, root=self.root, shallow=True).title
+
+    def __getitem__(self, key: str):
+        """Allow reading the "path" and "mtime" keys, like a dict."""
+        if key == "path":
+            return self.path
+        if key == "mtime":
+            return self.mtime
+        raise KeyError(key)
+
+    def __eq__(self, other):
+        """Tell if *other* references the same page."""
+        return (
+            isinstance(other, PageRef)
+            and self.root == other.root
+            and self.relpath == other.relpath
+        )
+
+    def __hash__(self):
+        """Hash the page's location."""
+        return hash((self.root, self.relpath))
+
+    def __repr__(self):
+        """Represent the reference."""
+        return "PageRef({!r}, {!r}, {!r})".format(
+            self.root, self.relpath, self.mtime
+        )
+
+
+def _relative(root: str, path: str) -> str:
+    """Return *path* relative to *root*, if it is under *root*."""
+    if root and path.startswith(root):
+        return path[len(root) :].lstrip(psep)  # noqa
+    return path
 
 
 class Page:
@@ -33,7 +99,24 @@ class Page:
     Basically, all manipulation on .md files should go via this
     """
 
-    converter = Markdown(extensions=MD_EXTS, output_format="html5")
+    renderer = BlockRenderer(
+        cache_size=int(
+            os.environ.get("SELF_WIKI_RENDER_CACHE_SIZE", "")
+            or BlockRenderer.DEFAULT_CACHE_SIZE
+        )
+    )
+    content_cache = PageCache(
+        budget=int(
+            os.environ.get("SELF_WIKI_PAGE_CACHE_SIZE", "")
+            or PageCache.DEFAULT_BUDGET
+        ),
+        mmap_threshold=int(
+            os.environ.get("SELF_WIKI_PAGE_MMAP_SIZE", "") or 0
+        ),
+    )
+    # A WriteBehindBuffer, whose pending autosaves are read instead of
+    # the files on disk
+    write_buffer = None
     logger.info("Enabled markdown extensions: %s", ", ".join(MD_EXTS))
 
     def __init__(self, path, root="", level=0, shallow=False):
@@ -46,7 +129,7 @@ class Page:
                       recurse a whole directory tree
         """
         if root != "" and root in path:
-            path = path[len(root) :]  # noqa
+            path = path[len(root) :].lstrip(psep)  # noqa
         self.root = root
         self._path = path
         self.level = level
@@ -54,24 +137,41 @@ class Page:
             self._path = self._path + ".md"
         self.markdown = ""
         self.meta = None
-        self.subpages = []
+        self.subpages = []  # type: List[PageRef]
         self.load(not shallow)
 
+    @classmethod
+    @contextmanager
+    def writing(cls, path: str):
+        """Hold the lock autosaves of *path* are written with, if any."""
+        if cls.write_buffer is None:
+            yield
+        else:
+            with cls.write_buffer.lock(path):
+                yield
+
+    @METRICS.timed("page_load")
     def load(self, load_children=False):
         """
         Load the markdown data from disk.
 
         Also sets object properties according to filesystem state.
         """
-        if not exists(self.path):
-            return
-        with open(self.path, "r") as markdown_file:
-            logger.debug(
-                "Found existing page content at %s. Loading at level %d",
-                self.path,
-                self.level,
-            )
-            self.markdown = markdown_file.read()
+        buffered = None
+        if self.write_buffer is not None:
+            buffered = self.write_buffer.get(self.path)
+        if buffered is not None:
+            self.markdown = buffered
+        else:
+            try:
+                self.markdown = self.content_cache.read(self.path)
+            except FileNotFoundError:
+                return
+        logger.debug(
+            "Found existing page content at %s. Loaded at level %d",
+            self.path,
+            self.level,
+        )
 
         # We need a way to make sure we don't read an entire directory tree
         if self.level > 0 or not load_children:
@@ -87,13 +187,12 @@ class Page:
                     self.level,
                 )
                 self.subpages.append(
-                    Page(
-                        pjoin(subpages_dir, markdown_file),
-                        root=self.root,
-                        level=self.level + 1,
+                    PageRef(
+                        self.root, pjoin(self._path[:-3], markdown_file)
                     )
                 )
 
+    @METRICS.timed("page_save")
     def save(self):
         """
         Persist the Page object on disk and update the recent files list.
@@ -102,15 +201,17 @@ class Page:
         """
         if psep in self.path and not exists(dirname(self.path)):
             makedirs(dirname(self.path))
-        with open(self.path, "w+") as save_file:
-            save_file.write(self.markdown)
+        replace_file(self.path, self.markdown)
+        self.content_cache.forget(self.path)
         # update self.meta
         self.render()
-        if repository is not None:
-            repository.index.add([self.path])
-            if repository.index.diff:
-                logger.info("Adding changes to page %s to git", self.title)
-                repository.index.commit(message="Change {}".format(self.title))
+        repo = repositories.get(self.root, repository)
+        if repo is not None:
+            with METRICS.timer("git"):
+                repo.index.add([self.path])
+                if repo.is_dirty(index=True, working_tree=False):
+                    logger.info("Adding changes to page %s to git", self.title)
+                    repo.index.commit(message="Change {}".format(self.title))
 
     @property
     def path(self) -> str:
@@ -140,10 +241,14 @@ class Page:
                 return line[2:]
         return self.relpath[:-3]
 
+    @METRICS.timed("page_render")
     def render(self) -> str:
-        """Render the markdown to HTML, using the object's converter."""
-        html = self.converter.convert(self.markdown)
-        self.meta = self.converter.Meta  # pylint: disable=E1101
+        """
+        Render the markdown to HTML, using the object's renderer.
+
+        Only the blocks that changed since they were last seen are converted.
+        """
+        html, self.meta = self.renderer.render(self.markdown)
         return html
 
 
@@ -153,12 +258,13 @@ class RecentFileManager:
     DEFAULT_LIMIT = 20
 
     @classmethod
+    @METRICS.timed("recent_scan")
     def get_recent_files(
         cls,
         directory: str,
         limit: Optional[int] = DEFAULT_LIMIT,
         wanted_extensions: Optional[List[str]] = None,
-    ) -> List[Dict[str, Union[str, int]]]:
+    ) -> List[PageRef]:
         """
         Return the list of recent files.
 
@@ -170,16 +276,15 @@ class RecentFileManager:
                       return all results.
         :param wanted_extensions: A list of file extensions we want.
                                   If None, ['md'] is used.
-        :return: a dictionary list with, where each dict has the
-                 following keys: path, mtime
+        :return: a list of PageRef, relative to *directory*
         """
         files = []
         if not wanted_extensions:
             wanted_extensions = ["md"]
         for path, dirnames, filenames in walk(directory):
             dirnames[:] = [
-                d for d in dirnames if d != ".git"
-            ]  # remove git dir(s)
+                d for d in dirnames if d not in (".git", STORE_DIRNAME)
+            ]  # remove git dir(s) and the attachment store
             for fname in filenames:
                 if fname == "todos.json":
                     continue
@@ -189,11 +294,15 @@ class RecentFileManager:
                     not in wanted_extensions
                 ):
                     continue
-                stat_result = stat(pjoin(path, fname))
+                full_path = pjoin(path, fname)
                 files.append(
-                    {"path": pjoin(path, fname), "mtime": stat_result.st_mtime}
+                    PageRef(
+                        directory,
+                        _relative(directory, full_path),
+                        stat(full_path).st_mtime,
+                    )
                 )
-        sorted_files = sorted(files, key=lambda x: x["mtime"], reverse=True)
+        sorted_files = sorted(files, key=lambda x: x.mtime, reverse=True)
         if limit is None:
             return sorted_files
         return sorted_files[:limit]
@@ -216,12 +325,22 @@ class RecentFileManager:
         self._file_list = RecentFileManager.get_recent_files(
             directory=root, limit=limit, wanted_extensions=wanted_extensions
         )
+        self._version = 0
 
     @property
     def root(self) -> str:
         """Return the path we consider as root."""
         return self._root
 
+    @property
+    def version(self) -> int:
+        """
+        Return a counter incremented each time the list changes.
+
+        May be used to key caches derived from the recent files.
+        """
+        return self._version
+
     def re_scan(
         self,
         limit: Optional[int] = None,
@@ -240,7 +359,9 @@ class RecentFileManager:
             limit=limit,
             wanted_extensions=wanted_extensions,
         )
+        self._version += 1
 
+    @METRICS.timed("recent_update")
     def update(self, path: str):
         """
         Update the recency of the file designated by :param path:.
@@ -250,15 +371,13 @@ class RecentFileManager:
         :param path: path to the file, relative to RecentFileManager.root,
         or not.
         """
-        if not path.startswith(self._root):
-            path = pjoin(self._root, path)
         now = datetime.now()
         self.delete(path)
-        self._file_list.insert(0, {"path": path, "mtime": now.timestamp()})
+        ref = PageRef(self._root, _relative(self._root, path), now.timestamp())
+        self._file_list.insert(0, ref)
+        self._version += 1
 
-    def get(
-        self, limit: Optional[int] = None
-    ) -> List[Dict[str, Union[str, int]]]:
+    def get(self, limit: Optional[int] = None) -> List[PageRef]:
         """Return up to *limit* recent items."""
         if limit == 0:
             raise ValueError(
@@ -273,9 +392,48 @@ class RecentFileManager:
         """
         Delete :param path: from the recent files.
 
-        :param path: The exact path we should forget.
+        :param path: The exact path we should forget, relative to
+                     RecentFileManager.root or not.
+        """
+        self.bulk_update(deleted=[path])
+
+    @METRICS.timed("recent_bulk_update")
+    def bulk_update(
+        self,
+        renamed: Optional[Dict[str, str]] = None,
+        deleted: Iterable[str] = (),
+        touched: Iterable[str] = (),
+    ):
+        """
+        Apply many changes at once, in a single pass over the list.
+
+        Paths may be relative to RecentFileManager.root, or not.
 
+        :param renamed: a mapping of old paths to new paths. Renamed files
+                        keep their recency.
+        :param deleted: paths to forget
+        :param touched: paths that just changed, moved to the top of the
+                        list. They are taken after renaming.
         """
+        root = self._root
+        renamed = {
+            _relative(root, old): _relative(root, new)
+            for old, new in (renamed or {}).items()
+        }
+        deleted = set(_relative(root, p) for p in deleted)
+        touched = set(_relative(root, p) for p in touched)
+        now = datetime.now().timestamp()
+        kept = []
+        for ref in self._file_list:
+            if ref.relpath in deleted:
+                continue
+            new_relpath = renamed.get(ref.relpath, ref.relpath)
+            if new_relpath in touched:
+                continue
+            if new_relpath != ref.relpath:
+                ref = PageRef(root, new_relpath, ref.mtime)
+            kept.append(ref)
         self._file_list[:] = [
-            d for d in self._file_list if d.get("path") != path
-        ]
+            PageRef(root, p, now) for p in sorted(touched)
+        ] + kept
+        self._version += 1
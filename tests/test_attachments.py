@@ -0,0 +1,61 @@
+import os
+from os.path import exists, join as pjoin, samefile
+from tempfile import TemporaryDirectory
+
+from self_wiki.attachments import AttachmentStore, FILE_MODE
+
+
+def upload(store, data):
+    f = store.stream_factory()
+    f.write(data)
+    f.seek(0)
+    return f
+
+
+def test_store_deduplicates():
+    with TemporaryDirectory() as root:
+        store = AttachmentStore(root)
+        first, second = pjoin(root, "a", "x.bin"), pjoin(root, "b", "y.bin")
+        assert store.add(upload(store, b"data"), first)
+        assert store.add(upload(store, b"data"), second)
+        assert samefile(first, second)
+        assert os.stat(first).st_mode & 0o777 == FILE_MODE
+        blobs = os.listdir(pjoin(store.root, "3a"))
+        assert len(blobs) == 1
+        assert not os.listdir(pjoin(store.root, "tmp"))
+
+
+def test_store_same_content_unchanged():
+    with TemporaryDirectory() as root:
+        store = AttachmentStore(root)
+        target = pjoin(root, "x.bin")
+        assert store.add(upload(store, b"data"), target)
+        assert not store.add(upload(store, b"data"), target)
+        assert store.add(upload(store, b"other data"), target)
+        with open(target, "rb") as f:
+            assert f.read() == b"other data"
+
+
+def test_discard():
+    with TemporaryDirectory() as root:
+        store = AttachmentStore(root)
+        f = upload(store, b"data")
+        f.discard()
+        assert not exists(f.name)
+
+
+def test_replace_file_breaks_links():
+    from self_wiki.attachments import replace_file
+
+    with TemporaryDirectory() as root:
+        store = AttachmentStore(root)
+        first, second = pjoin(root, "a", "x.md"), pjoin(root, "b", "x.md")
+        store.add(upload(store, b"data"), first)
+        store.add(upload(store, b"data"), second)
+        replace_file(first, "changed")
+        with open(second) as f:
+            assert f.read() == "data"
+        with open(first) as f:
+            assert f.read() == "changed"
+        assert os.stat(first).st_mode & 0o777 == FILE_MODE
+        assert os.listdir(pjoin(root, "a")) == ["x.md"]
@@ -0,0 +1,94 @@
+import time
+from threading import Lock, Thread
+
+from self_wiki.autosave import WriteBehindBuffer
+
+
+class Recorder:
+    def __init__(self, duration=0.0):
+        self.writes = []
+        self.duration = duration
+        self.active = 0
+        self.overlaps = 0
+        self._lock = Lock()
+
+    def __call__(self, path, markdown, context):
+        with self._lock:
+            self.active += 1
+            if self.active > 1:
+                self.overlaps += 1
+        time.sleep(self.duration)
+        self.writes.append((path, markdown, context))
+        with self._lock:
+            self.active -= 1
+
+
+def test_autosaves_are_buffered():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, delay=60)
+    buffer.autosave("/a.md", "first", "ctx")
+    buffer.autosave("/a.md", "second", "ctx")
+    assert recorder.writes == []
+    assert buffer.get("/a.md") == "second"
+    assert len(buffer) == 1
+    buffer.flush_all()
+    assert recorder.writes == [("/a.md", "second", "ctx")]
+    assert buffer.get("/a.md") is None
+
+
+def test_explicit_save_replaces_autosave():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, delay=60)
+    buffer.autosave("/a.md", "draft")
+    buffer.save("/a.md", "final")
+    buffer.flush_all()
+    assert recorder.writes == [("/a.md", "final", None)]
+
+
+def test_autosaves_are_written_after_the_delay():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, delay=0.05)
+    buffer.autosave("/a.md", "one")
+    time.sleep(0.02)
+    buffer.autosave("/a.md", "two")  # does not push the write back
+    deadline = time.monotonic() + 2
+    while not recorder.writes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert recorder.writes == [("/a.md", "two", None)]
+
+
+def test_no_delay_writes_immediately():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, delay=0)
+    buffer.autosave("/a.md", "now")
+    assert recorder.writes == [("/a.md", "now", None)]
+
+
+def test_writes_to_a_path_never_overlap():
+    recorder = Recorder(duration=0.01)
+    buffer = WriteBehindBuffer(recorder, delay=60)
+    threads = [
+        Thread(target=buffer.save, args=("/a.md", str(i))) for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(recorder.writes) == 8
+    assert recorder.overlaps == 0
+
+
+def test_failed_writes_are_retried_later():
+    attempts = []
+
+    def failing(path, markdown, context):
+        attempts.append(time.monotonic())
+        raise OSError("disk full")
+
+    buffer = WriteBehindBuffer(failing, delay=0.05)
+    buffer.autosave("/a.md", "content")
+    time.sleep(0.3)
+    # once per delay, not in a loop
+    assert 2 <= len(attempts) <= 7
+    assert buffer.get("/a.md") == "content"
+    buffer.discard("/a.md")
@@ -0,0 +1,44 @@
+from self_wiki import compression
+
+
+def test_negotiate(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert compression.negotiate("") is None
+    assert compression.negotiate("gzip, deflate") == "gzip"
+    assert compression.negotiate("gzip;q=0, deflate") is None
+    assert compression.negotiate("*") == "gzip"
+    assert compression.negotiate("br") is None
+
+
+def test_negotiate_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", object())
+    assert compression.negotiate("gzip, br") == "br"
+    assert compression.negotiate("gzip, br;q=0.5") == "gzip"
+
+
+def test_is_compressible():
+    assert compression.is_compressible("text/html")
+    assert compression.is_compressible("application/json")
+    assert not compression.is_compressible("image/png")
+    assert not compression.is_compressible(None)
+
+
+def test_precompressor_stays_in_static_folder():
+    import os
+    from os.path import exists, join as pjoin
+    from tempfile import TemporaryDirectory
+
+    with TemporaryDirectory() as root:
+        static, outside = pjoin(root, "static"), pjoin(root, "secret.txt")
+        os.makedirs(pjoin(static, "lib"))
+        with open(outside, "w+") as f:
+            f.write("secret")
+        with open(pjoin(static, "lib", "app.js"), "w+") as f:
+            f.write("var a;")
+        precompressor = compression.StaticPrecompressor(static)
+        assert precompressor.path_for("../secret.txt", "gzip") is None
+        assert not exists(outside + ".gz")
+        assert precompressor.path_for("lib", "gzip") is None
+        assert precompressor.path_for("lib/app.js", "gzip") == pjoin(
+            static, "lib", "app.js.gz"
+        )
@@ -0,0 +1,83 @@
+import json
+import os
+from os.path import exists, join as pjoin
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from self_wiki.export import Exporter, MANIFEST_NAME, static_href
+
+
+def write(root, path, content):
+    os.makedirs(os.path.dirname(pjoin(root, path)), exist_ok=True)
+    with open(pjoin(root, path), "w+") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def content_root():
+    with TemporaryDirectory() as root:
+        write(root, "index.md", "# Index\n\n[[Other]]")
+        write(root, "section.md", "# Section")
+        write(root, "section/child.md", "# Child")
+        write(root, "section/file.txt", "attachment")
+        yield root
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_export(content_root, jobs):
+    with TemporaryDirectory() as output:
+        stats = Exporter(content_root, output, jobs=jobs).export()
+        assert stats["rendered"] == 3
+        assert stats["copied"] == 1
+        with open(pjoin(output, "section.html")) as f:
+            html = f.read()
+        assert "<h1 id=\"section\">Section</h1>" in html
+        assert '<a href="/section/child.html">Child</a>' in html
+        assert "/static/app." in html and "/static/app.js" not in html
+        assert "todoList" not in html and "searchbox" not in html
+        with open(pjoin(output, "index.html")) as f:
+            assert 'href="/Other.html"' in f.read()
+        assert exists(pjoin(output, "section", "file.txt"))
+        with open(pjoin(output, MANIFEST_NAME)) as f:
+            assert set(json.load(f)["pages"]) == {
+                "index.md",
+                "section.md",
+                pjoin("section", "child.md"),
+            }
+
+
+def test_incremental_export(content_root):
+    with TemporaryDirectory() as output:
+        exporter = Exporter(content_root, output, jobs=1)
+        exporter.export()
+        stats = exporter.export()
+        assert stats["rendered"] == 0 and stats["copied"] == 0
+        # the parent shows the child's title, so both are rendered again
+        write(content_root, "section/child.md", "# Renamed child")
+        stats = exporter.export()
+        assert stats["rendered"] == 2
+        with open(pjoin(output, "section.html")) as f:
+            assert "Renamed child</a>" in f.read()
+        os.remove(pjoin(content_root, "index.md"))
+        stats = exporter.export()
+        assert stats["removed"] == 1 and stats["rendered"] == 0
+        assert not exists(pjoin(output, "index.html"))
+        assert exporter.export(full=True)["rendered"] == 2
+
+
+@pytest.mark.parametrize(
+    "url,expected",
+    [
+        ("/", "/index.html"),
+        ("/a/page", "/a/page.html"),
+        ("/Wiki_link/", "/Wiki_link.html"),
+        ("child#part", "child.html#part"),
+        ("/a/page.md", "/a/page.html"),
+        ("/a/file.pdf", "/a/file.pdf"),
+        ("https://example.com/page", "https://example.com/page"),
+        ("#anchor", "#anchor"),
+    ],
+)
+def test_static_href(url, expected):
+    assert static_href(url) == expected
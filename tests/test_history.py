@@ -0,0 +1,81 @@
+from os.path import join as pjoin
+from tempfile import TemporaryDirectory
+
+import pytest
+from git import Actor, Repo
+
+from self_wiki.history import HistoryIndex
+
+AUTHOR = Actor("Tester", "tester@example.com")
+
+
+def commit(repository, path, content, message):
+    with open(pjoin(repository.working_tree_dir, path), "w+") as f:
+        f.write(content)
+    repository.index.add([path])
+    return repository.index.commit(
+        message, author=AUTHOR, committer=AUTHOR
+    ).hexsha
+
+
+@pytest.fixture
+def repository():
+    with TemporaryDirectory() as root:
+        yield Repo.init(root)
+
+
+def test_history_is_incremental(repository):
+    index_path = pjoin(repository.git_dir, "history.json")
+    first = commit(repository, "a.md", "# A", "Change A")
+    commit(repository, "b.md", "# B", "Change B")
+    index = HistoryIndex(repository, index_path)
+    assert index.update() == 2
+    assert index.update() == 0
+    second = commit(repository, "a.md", "# A, again", "Change A again")
+    assert [h["rev"] for h in index.history("a.md")] == [second, first]
+    assert index.history("a.md")[0]["message"] == "Change A again"
+    assert index.history("a.md")[0]["author"] == "Tester"
+    # a new index picks up where the persisted one stopped
+    assert HistoryIndex(repository, index_path).update() == 0
+
+
+def test_read_revision(repository):
+    index = HistoryIndex(repository, pjoin(repository.git_dir, "h.json"))
+    first = commit(repository, "a.md", "# A", "Change A")
+    commit(repository, "a.md", "# A2", "Change A")
+    assert index.read("a.md", first) == b"# A"
+    assert index.read("a.md", "HEAD") == b"# A2"
+    assert index.read("missing.md", first) is None
+    assert index.read("a.md", "0" * 40) is None
+
+
+def test_non_ascii_paths(repository):
+    index = HistoryIndex(repository, pjoin(repository.git_dir, "h.json"))
+    sha = commit(repository, "café.md", "# Café", "Change café")
+    # answered by git while the index is not built
+    assert [h["rev"] for h in index.history("café.md")] == [sha]
+    index.update()
+    assert [h["rev"] for h in index.history("café.md")] == [sha]
+
+
+def test_index_is_appended_to(repository):
+    index_path = pjoin(repository.git_dir, "h.json")
+    first = commit(repository, "a.md", "# A", "Change A")
+    HistoryIndex(repository, index_path).update()
+    with open(index_path, "rb") as f:
+        persisted = f.read()
+    commit(repository, "b.md", "# B", "Change B")
+    index = HistoryIndex(repository, index_path)
+    assert index.update() == 1
+    with open(index_path, "rb") as f:
+        appended = f.read()
+    assert appended.startswith(persisted)
+    assert appended.count(b"\n") == persisted.count(b"\n") + 1
+    # an interrupted write is dropped
+    with open(index_path, "ab") as f:
+        f.write(b'["trunc')
+    index = HistoryIndex(repository, index_path)
+    assert index.update() == 0
+    with open(index_path, "rb") as f:
+        assert f.read() == appended
+    assert [h["rev"] for h in index.history("a.md")] == [first]
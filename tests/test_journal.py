@@ -0,0 +1,79 @@
+import os
+from datetime import date
+from os.path import exists, join as pjoin
+
+from self_wiki.journal import JournalIndex, done_entries, week_range
+from self_wiki.utils import write_todo_to_journal
+
+
+def test_done_entries():
+    markdown = "# journal\n\n## Done\n\n* 0: one\n- 1: two\n\n## Notes\n\n* no"
+    assert done_entries(markdown) == ["0: one", "1: two"]
+
+
+def test_week_range():
+    assert week_range(2024, 1) == (date(2024, 1, 1), date(2024, 1, 7))
+    assert week_range(2021, 1) == (date(2021, 1, 4), date(2021, 1, 10))
+
+
+def test_writer_feeds_the_index(tmpdir):
+    root = str(tmpdir) + os.sep
+    index_path = pjoin(str(tmpdir), "journal-index.json")
+    journal = JournalIndex(root, index_path)
+    day = date(2024, 3, 5)
+    write_todo_to_journal(root, {"id": 1, "text": "one"}, journal, day)
+    write_todo_to_journal(root, {"id": 2, "text": "two"}, journal, day)
+    assert exists(pjoin(root, "journal", "2024", "03", "05.md"))
+    with open(pjoin(root, "journal", "2024", "03", "05.md")) as f:
+        assert f.read().count("## Done") == 1
+    rollup = journal.rollup(date(2024, 3, 1), date(2024, 3, 31))
+    assert rollup == [
+        {
+            "date": "2024-03-05",
+            "path": "journal/2024/03/05",
+            "done": ["1: one", "2: two"],
+        }
+    ]
+    # persisted
+    assert JournalIndex(root, index_path).rollup(
+        date(2024, 1, 1), date(2024, 12, 31)
+    ) == rollup
+
+
+def test_writer_merges_buffered_autosaves(tmpdir, monkeypatch):
+    from self_wiki.autosave import WriteBehindBuffer
+    from self_wiki.wiki import Page
+
+    root = str(tmpdir) + os.sep
+    writes = []
+    buffer = WriteBehindBuffer(lambda *args: writes.append(args), delay=60)
+    monkeypatch.setattr(Page, "write_buffer", buffer)
+    path = pjoin(root, "journal", "2024", "03", "05.md")
+    buffer.autosave(path, "# Notes\n\nDraft")
+    write_todo_to_journal(root, {"id": 1, "text": "one"}, day=date(2024, 3, 5))
+    with open(path) as f:
+        assert f.read() == "# Notes\n\nDraft\n\n## Done\n\n* 1: one\n"
+    assert buffer.get(path) is None
+    buffer.flush_all()
+    assert writes == []
+
+
+def test_index_follows_file_changes(tmpdir):
+    root = str(tmpdir) + os.sep
+    journal = JournalIndex(root)
+    month_dir = pjoin(root, "journal", "2023", "12")
+    os.makedirs(month_dir)
+    with open(pjoin(month_dir, "31.md"), "w+") as f:
+        f.write("## Done\n\n* 0: last\n")
+    span = (date(2023, 12, 25), date(2024, 1, 7))
+    assert [d["done"] for d in journal.rollup(*span)] == [["0: last"]]
+    with open(pjoin(month_dir, "31.md"), "w+") as f:
+        f.write("## Done\n\n* 0: last\n* 1: edited outside\n")
+    assert [d["done"] for d in journal.rollup(*span)] == [
+        ["0: last", "1: edited outside"]
+    ]
+    os.makedirs(pjoin(root, "journal", "2024", "01"))
+    with open(pjoin(root, "journal", "2024", "01", "02.md"), "w+") as f:
+        f.write("## Done\n\n* 2: new year\n")
+    os.remove(pjoin(month_dir, "31.md"))
+    assert [d["date"] for d in journal.rollup(*span)] == ["2024-01-02"]
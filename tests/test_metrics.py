@@ -0,0 +1,41 @@
+from self_wiki.metrics import Metrics, server_timing
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    metrics.incr("counter")
+    with metrics.timer("stage"):
+        pass
+    metrics.start_request()
+    assert metrics.finish_request("endpoint") == {}
+    assert metrics.render() == "\n"
+
+
+def test_counters_and_histograms():
+    metrics = Metrics(enabled=True)
+    metrics.incr("hits_total", result="hit")
+    metrics.incr("hits_total", result="hit")
+    metrics.observe("latency_seconds", 0.003)
+    text = metrics.render()
+    assert "# TYPE hits_total counter" in text
+    assert 'hits_total{result="hit"} 2' in text
+    assert 'latency_seconds_bucket{le="0.0025"} 0' in text
+    assert 'latency_seconds_bucket{le="0.005"} 1' in text
+    assert "latency_seconds_count 1" in text
+
+
+def test_request_stages():
+    metrics = Metrics(enabled=True)
+
+    @metrics.timed("work")
+    def work():
+        return 42
+
+    metrics.start_request()
+    assert work() == 42
+    stages = metrics.finish_request("page")
+    assert set(stages.keys()) == {"work", "total"}
+    assert server_timing({"work": 0.0015}) == "work;dur=1.500"
+    assert 'self_wiki_request_duration_seconds_count{endpoint="page"} 1' in (
+        metrics.render()
+    )
@@ -0,0 +1,68 @@
+import os
+from os.path import join as pjoin
+
+import pytest
+
+from self_wiki.pagecache import PageCache
+
+
+def _write(path, content, mtime=None):
+    with open(path, "w+") as f:
+        f.write(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_read_hits_until_the_file_changes(tmpdir):
+    path = pjoin(str(tmpdir), "page.md")
+    _write(path, "first", mtime=1000)
+    cache = PageCache()
+    assert cache.read(path) == "first"
+    assert cache.read(path) == "first"
+    assert (cache.hits, cache.misses) == (1, 1)
+    _write(path + ".new", "second version", mtime=1000)
+    os.replace(path + ".new", path)  # new inode
+    assert cache.read(path) == "second version"
+    assert cache.misses == 2
+    assert cache.used == len("second version")
+
+
+def test_budget_evicts_least_recently_used(tmpdir):
+    cache = PageCache(budget=40)
+    paths = [pjoin(str(tmpdir), "{}.md".format(i)) for i in range(5)]
+    for path in paths:
+        _write(path, "0123456789")
+        cache.read(path)
+    assert cache.used == 40
+    cache.read(paths[1])
+    _write(pjoin(str(tmpdir), "big.md"), "x" * 11)
+    cache.read(pjoin(str(tmpdir), "big.md"))  # above a quarter of budget
+    assert cache.used == 40
+    hits = cache.hits
+    cache.read(paths[1])
+    assert cache.hits == hits + 1
+    cache.read(paths[0])
+    assert cache.hits == hits + 1
+
+
+def test_missing_and_forgotten_files(tmpdir):
+    path = pjoin(str(tmpdir), "page.md")
+    _write(path, "content")
+    cache = PageCache()
+    cache.read(path)
+    os.remove(path)
+    with pytest.raises(FileNotFoundError):
+        cache.read(path)
+    assert cache.used == 0
+    _write(path, "content")
+    cache.read(path)
+    cache.forget()
+    assert cache.used == 0
+
+
+def test_mmap_reads_translate_newlines(tmpdir):
+    path = pjoin(str(tmpdir), "page.md")
+    with open(path, "wb") as f:
+        f.write("# Titre\r\n\r\nété\rfin".encode("utf-8"))
+    cache = PageCache(mmap_threshold=1)
+    assert cache.read(path) == "# Titre\n\nété\nfin"
@@ -0,0 +1,57 @@
+from markdown import Markdown
+
+from self_wiki.render import BlockRenderer, MD_EXTS, split_blocks
+
+
+def test_split_blocks_keeps_fences_and_lists_together():
+    blocks = split_blocks(
+        "# Title\n\n```\na\n\nb\n```\n\n* one\n\n* two\n\n    more\n\ntext"
+    )
+    assert blocks == [
+        "# Title",
+        "```\na\n\nb\n```",
+        "* one\n\n* two\n\n    more",
+        "text",
+    ]
+
+
+def test_render_only_changed_blocks():
+    renderer = BlockRenderer()
+    renderer.render("# Title\n\nfirst\n\nsecond")
+    assert renderer.misses == 3
+    renderer.render("# Title\n\nfirst\n\nsecond, edited")
+    assert renderer.misses == 4
+    assert renderer.hits == 2
+
+
+def test_render_meta_only_from_first_block():
+    html, meta = BlockRenderer().render(
+        "Title: A title\n\n# Header\n\nNote: not metadata"
+    )
+    assert meta == {"title": ["A title"]}
+    assert "Note: not metadata" in html
+
+
+def test_render_unique_header_ids():
+    html, _ = BlockRenderer().render("# Same\n\ntext\n\n# Same")
+    assert 'id="same"' in html
+    assert 'id="same_1"' in html
+
+
+def test_render_footnotes_like_whole_document():
+    markdown = "Some text[^1].\n\nOther paragraph.\n\n[^1]: A footnote."
+    converter = Markdown(extensions=MD_EXTS, output_format="html5")
+    html, _ = BlockRenderer().render(markdown)
+    assert html == converter.convert(markdown)
+
+
+def test_render_definition_lists_like_whole_document():
+    converter = Markdown(extensions=MD_EXTS, output_format="html5")
+    for markdown in (
+        "Term\n:   def\n\nTerm2\n\n:   def2",
+        "Term\n:   def\n\nTerm2\n:   def2",
+        "Term\n:   def\n\nParagraph",
+        "Paragraph\n\nTerm\n\n:   def",
+    ):
+        html, _ = BlockRenderer().render(markdown)
+        assert html == converter.reset().convert(markdown)
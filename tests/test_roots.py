@@ -0,0 +1,115 @@
+import os
+from os.path import exists, join as pjoin
+
+import pytest
+
+from self_wiki.roots import (
+    ContentRoot,
+    ENVIRON_KEY,
+    RootDispatcher,
+    parse_roots,
+)
+
+
+def test_parse_roots():
+    roots = parse_roots(" work=/srv/work ;home=/srv/home/;")
+    assert roots == {"work": "/srv/work" + os.sep, "home": "/srv/home/"}
+    assert parse_roots("") == {}
+    with pytest.raises(ValueError):
+        parse_roots("work")
+    with pytest.raises(ValueError):
+        parse_roots("=/srv/work")
+
+
+def _call(dispatcher, path, host="localhost"):
+    seen = {}
+
+    def start_response(status, headers):
+        pass
+
+    def app(environ, start_response):
+        seen.update(environ)
+        return []
+
+    dispatcher.wsgi_app = app
+    dispatcher(
+        {"PATH_INFO": path, "SCRIPT_NAME": "", "HTTP_HOST": host},
+        start_response,
+    )
+    return seen
+
+
+def test_dispatch_by_prefix(tmpdir):
+    default = ContentRoot("", str(tmpdir.mkdir("default")) + os.sep)
+    work = ContentRoot("work", str(tmpdir.mkdir("work")) + os.sep)
+    dispatcher = RootDispatcher(None, default, {"work": work})
+    environ = _call(dispatcher, "/work/some/page")
+    assert environ[ENVIRON_KEY] is work
+    assert environ["SCRIPT_NAME"] == "/work"
+    assert environ["PATH_INFO"] == "/some/page"
+    environ = _call(dispatcher, "/work")
+    assert environ[ENVIRON_KEY] is work
+    assert environ["PATH_INFO"] == "/"
+    environ = _call(dispatcher, "/workshop/page")
+    assert environ[ENVIRON_KEY] is default
+    assert environ["PATH_INFO"] == "/workshop/page"
+
+
+def test_dispatch_by_host(tmpdir):
+    default = ContentRoot("", str(tmpdir.mkdir("default")) + os.sep)
+    work = ContentRoot("work", str(tmpdir.mkdir("work")) + os.sep)
+    dispatcher = RootDispatcher(None, default, {"work": work}, by_host=True)
+    environ = _call(dispatcher, "/work/page", host="work:4000")
+    assert environ[ENVIRON_KEY] is work
+    assert environ["PATH_INFO"] == "/work/page"
+    assert _call(dispatcher, "/page")[ENVIRON_KEY] is default
+
+
+def test_roots_are_isolated(tmpdir):
+    import self_wiki
+
+    self_wiki.app.config["TESTING"] = True
+    client = self_wiki.app.test_client()
+    work = ContentRoot("work", str(tmpdir.mkdir("work")) + os.sep)
+    overrides = {ENVIRON_KEY: work, "SCRIPT_NAME": "/work"}
+    rv = client.put(
+        "/isolated/edit/save",
+        json={"markdown": "# Isolated"},
+        environ_overrides=overrides,
+    )
+    assert rv.status_code == 201
+    assert exists(pjoin(work.path, "isolated.md"))
+    assert not exists(pjoin(self_wiki.CONTENT_ROOT, "isolated.md"))
+    rv = client.get("/search", environ_overrides=overrides)
+    assert [r["path"] for r in rv.json] == ["/isolated.md"]
+    paths = [r["path"] for r in client.get("/search").json]
+    assert "/isolated.md" not in paths
+    rv = client.get("/isolated", environ_overrides=overrides)
+    assert rv.status_code == 200
+    assert b"Isolated" in rv.data
+    assert b'SELF_WIKI.base = "/work"' in rv.data
+    rv = client.post(
+        "/todo", json={"text": "work todo"}, environ_overrides=overrides
+    )
+    assert rv.status_code == 201
+    assert "work todo" not in [t["text"] for t in client.get("/todo").json]
+    assert exists(pjoin(work.path, "todos.json"))
+
+
+def test_accel_redirect_per_root(tmpdir):
+    import self_wiki
+    from self_wiki import views
+
+    self_wiki.app.config["TESTING"] = True
+    client = self_wiki.app.test_client()
+    work = ContentRoot("work", str(tmpdir.mkdir("work")) + os.sep)
+    with open(pjoin(work.path, "report.pdf"), "wb") as report:
+        report.write(b"%PDF")
+    overrides = {ENVIRON_KEY: work, "SCRIPT_NAME": "/work"}
+    views.SENDFILE = "x-accel-redirect"
+    try:
+        rv = client.get("/report.pdf", environ_overrides=overrides)
+    finally:
+        views.SENDFILE = ""
+    assert rv.status_code == 200
+    assert rv.headers["X-Accel-Redirect"] == "/_attachments/work/report.pdf"
@@ -0,0 +1,130 @@
+import os
+from os.path import exists, join as pjoin
+from tempfile import TemporaryDirectory
+
+import pytest
+from git import Actor, Repo
+
+from self_wiki import subtree
+from self_wiki.roots import ContentRoot
+
+AUTHOR = Actor("Tester", "tester@example.com")
+
+
+def write(root, relpath, content):
+    os.makedirs(os.path.dirname(pjoin(root, relpath)), exist_ok=True)
+    with open(pjoin(root, relpath), "w+") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def root():
+    with TemporaryDirectory() as path:
+        path = path + os.sep
+        repository = Repo.init(path)
+        write(path, "section.md", "# Section\n\nSee [child](/section/child)")
+        write(path, "section/child.md", "# Child")
+        write(path, "section/child/deep.md", "# Deep")
+        write(path, "section/picture.png", "not really a png")
+        write(path, "other.md", "[[section]], [x](/section/child#top)")
+        write(path, "unrelated.md", "[x](/sections)")
+        repository.index.add(
+            [
+                "section.md",
+                "section/child.md",
+                "section/child/deep.md",
+                "section/picture.png",
+                "other.md",
+                "unrelated.md",
+            ]
+        )
+        repository.index.commit("Init", author=AUTHOR, committer=AUTHOR)
+        root = ContentRoot("", path, repository=repository)
+        yield root
+        root.history.wait(5)
+
+
+def test_rewrite_links():
+    markdown = (
+        "[a](/old/page) [b](/old) [c](/older) [[old]] [[older]]\n"
+        "[ref]: /old/page.md#anchor \"title\"\n"
+    )
+    assert subtree.rewrite_links(markdown, "old", "new/place") == (
+        "[a](/new/place/page) [b](/new/place) [c](/older) [old](/new/place) "
+        "[[older]]\n"
+        "[ref]: /new/place/page.md#anchor \"title\"\n"
+    )
+    assert subtree.rewrite_links("[[old]]", "old", "new") == "[[new]]"
+
+
+def test_move(root):
+    commits = len(list(root.repository.iter_commits()))
+    version = root.recent_files.version
+    result = subtree.move(root, "section", "archive/2024", links=True)
+    assert sorted(result["moved"].values()) == [
+        "archive/2024.md",
+        "archive/2024/child.md",
+        "archive/2024/child/deep.md",
+        "archive/2024/picture.png",
+    ]
+    assert result["rewritten"] == ["other.md"]
+    assert not exists(pjoin(root.path, "section"))
+    with open(pjoin(root.path, "archive/2024.md")) as f:
+        assert f.read() == "# Section\n\nSee [child](/archive/2024/child)"
+    with open(pjoin(root.path, "other.md")) as f:
+        assert f.read() == "[section](/archive/2024), [x](/archive/2024/child#top)"
+    with open(pjoin(root.path, "unrelated.md")) as f:
+        assert f.read() == "[x](/sections)"
+    assert root.recent_files.version == version + 1
+    relpaths = [ref.relpath for ref in root.recent_files.get()]
+    assert relpaths[0] == "other.md"
+    assert "archive/2024/child/deep.md" in relpaths
+    assert not [p for p in relpaths if p.startswith("section")]
+    assert len(list(root.repository.iter_commits())) == commits + 1
+    assert not root.repository.is_dirty(untracked_files=True)
+
+
+def test_move_merges_buffered_autosaves(root, monkeypatch):
+    from self_wiki.autosave import WriteBehindBuffer
+    from self_wiki.wiki import Page
+
+    writes = []
+    buffer = WriteBehindBuffer(lambda *args: writes.append(args), delay=60)
+    monkeypatch.setattr(Page, "write_buffer", buffer)
+    other = pjoin(root.path, "other.md")
+    buffer.autosave(other, "Draft: [[section]]")
+    result = subtree.move(root, "section", "moved", links=True)
+    assert result["rewritten"] == ["other.md"]
+    with open(other) as f:
+        assert f.read() == "Draft: [[moved]]"
+    assert buffer.get(other) is None
+    buffer.flush_all()
+    assert writes == []
+
+
+def test_move_errors(root):
+    with pytest.raises(subtree.SubtreeError) as error:
+        subtree.move(root, "section", "other")
+    assert error.value.status == 409
+    with pytest.raises(subtree.SubtreeError) as error:
+        subtree.move(root, "section", "section/child/inside")
+    assert error.value.status == 409
+    with pytest.raises(subtree.SubtreeError) as error:
+        subtree.move(root, "missing", "elsewhere")
+    assert error.value.status == 404
+    with pytest.raises(subtree.SubtreeError):
+        subtree.move(root, "section", "../outside")
+
+
+def test_delete(root):
+    commits = len(list(root.repository.iter_commits()))
+    files = subtree.delete(root, "section")
+    assert len(files) == 4
+    assert not exists(pjoin(root.path, "section.md"))
+    assert not exists(pjoin(root.path, "section"))
+    assert sorted(ref.relpath for ref in root.recent_files.get()) == [
+        "other.md",
+        "unrelated.md",
+    ]
+    assert len(list(root.repository.iter_commits())) == commits + 1
+    assert not root.repository.is_dirty(untracked_files=True)
@@ -1,3 +1,6 @@
+import json
+
+import pytest
 from tempfile import mktemp
 
 from self_wiki.todo import TodoList
@@ -36,3 +39,103 @@ def test_todo_list_persist():
     assert len(todo_list.todos) == 1
     todo_list = TodoList(path)
     assert len(todo_list.todos) == 1
+
+
+def _todo_list(todos):
+    todo_list = TodoList(mktemp())
+    for todo in todos:
+        todo_list.from_json(todo)
+    return todo_list
+
+
+def test_todo_list_query_filters():
+    todo_list = _todo_list(
+        [
+            {"text": "Buy milk #errands", "due": "2024-01-10"},
+            {"text": "buy bread", "done": True, "tags": ["Errands"]},
+            {"text": "Write report", "due": "2024-02-01"},
+            {"text": "call mom", "due": "2024-01-20"},
+        ]
+    )
+
+    def ids(**kwargs):
+        return [t["id"] for t in todo_list.query(**kwargs)[0]]
+
+    assert ids() == [0, 1, 2, 3]
+    assert ids(done=False) == [0, 2, 3]
+    assert ids(prefix="BUY") == [0, 1]
+    assert ids(tag="errands") == [0, 1]
+    assert ids(tag="errands", done=True) == [1]
+    assert ids(due_after="2024-01-10", due_before="2024-01-20") == [0, 3]
+    assert ids(due_before="2024-01-31", order="due", reverse=True) == [3, 0]
+    assert ids(order="due") == [0, 3, 2, 1]
+    assert ids(order="text") == [1, 0, 3, 2]
+
+
+def test_todo_list_query_indexes_follow_changes():
+    todo_list = _todo_list([{"text": "one #a"}, {"text": "two"}])
+    todo_list.from_json({"id": 0, "text": "one #b", "done": True})
+    assert todo_list.query(tag="a")[0] == []
+    assert [t["id"] for t in todo_list.query(tag="b")[0]] == [0]
+    assert [t["id"] for t in todo_list.query(done=False)[0]] == [1]
+    assert todo_list.delete(0)["text"] == "one #b"
+    assert todo_list.delete(0) is None
+    assert todo_list.query(tag="b")[0] == []
+    assert len(TodoList(todo_list._serialization_path).todos) == 1
+
+
+def test_todo_list_query_pagination():
+    todo_list = _todo_list([{"text": "item {:02}".format(i)} for i in range(7)])
+    for order, reverse in (("id", False), ("text", True), ("due", False)):
+        seen, cursor = [], None
+        while True:
+            todos, cursor = todo_list.query(
+                order=order, reverse=reverse, limit=3, cursor=cursor
+            )
+            seen.extend(t["id"] for t in todos)
+            if cursor is None:
+                break
+        assert sorted(seen) == list(range(7))
+        assert len(seen) == 7
+    todos, cursor = todo_list.query(done=False, limit=3)
+    todos, cursor = todo_list.query(done=False, limit=3, cursor=cursor)
+    assert [t["id"] for t in todos] == [3, 4, 5]
+    with pytest.raises(ValueError):
+        todo_list.query(cursor="not a cursor")
+    with pytest.raises(ValueError):
+        todo_list.query(order="text", cursor=cursor)
+    with pytest.raises(ValueError):
+        todo_list.query(order="priority")
+
+
+def test_todo_list_mixed_types():
+    path = mktemp()
+    with open(path, "w+") as todo_file:
+        json.dump(
+            [
+                {"id": 0, "due": "2024-01-10"},
+                {"id": "1", "due": 20240110, "tags": [1]},
+                {"id": 2, "text": 5},
+                {"text": "no id"},
+                {"id": 3},
+                "not a todo",
+            ],
+            todo_file,
+        )
+    todo_list = TodoList(path)
+    assert [t["id"] for t in todo_list.todos] == [0, "1", 2, 3, 1]
+    for order in ("id", "text", "due"):
+        seen, cursor = [], None
+        while True:
+            todos, cursor = todo_list.query(
+                order=order, limit=1, cursor=cursor
+            )
+            seen.extend(t["id"] for t in todos)
+            if cursor is None:
+                break
+        assert len(seen) == 5
+    assert [t["id"] for t in todo_list.query()[0]] == [0, 1, 2, 3, "1"]
+    assert [t["id"] for t in todo_list.query(tag="1")[0]] == ["1"]
+    assert [t["id"] for t in todo_list.query(due_after="2024")[0]] == [0]
+    todo_list.from_json({"id": "x", "text": None})
+    assert todo_list.get("x") is not None
@@ -90,6 +90,63 @@ class TestTodoApi:
         assert hasattr(rv, "json")
         self.cleanup(client)
 
+    def test_done_todo_goes_to_journal(self, client):
+        import self_wiki
+        from datetime import date
+
+        today = date.today()
+        day_path = pjoin(
+            self_wiki.CONTENT_ROOT, today.strftime("journal/%Y/%m/%d.md")
+        )
+        previous = None
+        if exists(day_path):
+            with open(day_path) as f:
+                previous = f.read()
+        try:
+            rv = client.post("/todo", json={"text": "journaled", "done": True})
+            assert rv.status_code == 201
+            todo_id = [
+                t["id"]
+                for t in client.get("/todo").json
+                if t["text"] == "journaled"
+            ][0]
+            assert client.delete("/todo", json={"id": todo_id}).status_code == 200
+            for url in (
+                today.strftime("/journal/%Y"),
+                today.strftime("/journal/%Y/%m"),
+                today.strftime("/journal/%G/w%V"),
+            ):
+                rv = client.get(url)
+                assert rv.status_code == 200
+                assert "{}: journaled".format(todo_id) in rv.json["days"][-1]["done"]
+            assert client.get("/journal/2024/13").status_code == 404
+            assert client.get("/journal/2024/w54").status_code == 404
+        finally:
+            if previous is None:
+                os.remove(day_path)
+            else:
+                with open(day_path, "w") as f:
+                    f.write(previous)
+
+    def test_query(self, client):
+        self.cleanup(client)
+        for i in range(5):
+            rv = client.post(
+                "/todo", json={"text": "query #t{}".format(i % 2)}
+            )
+            assert rv.status_code == 201
+        rv = client.get("/todo?tag=t0&limit=2")
+        assert rv.status_code == 200
+        assert [t["id"] for t in rv.json["todos"]] == [0, 2]
+        rv = client.get("/todo?tag=t0&limit=2&cursor=" + rv.json["next"])
+        assert [t["id"] for t in rv.json["todos"]] == [4]
+        assert rv.json["next"] is None
+        rv = client.get("/todo?order=id&desc=1&limit=1")
+        assert [t["id"] for t in rv.json["todos"]] == [4]
+        assert client.get("/todo?done=maybe").status_code == 400
+        assert client.get("/todo?cursor=nope").status_code == 400
+        self.cleanup(client)
+
 
 class TestSearchApi:
 
@@ -134,3 +191,283 @@ class TestWikiApi:
         )
         assert rv.status_code == 302
         assert rv.headers["Location"] == "http://localhost/test/edit"
+
+    def test_recent_sidebar_follows_saves(self, client: FlaskClient):
+        rv = client.put("/sidebar/edit/save", json={"markdown": "# Before"})
+        assert rv.status_code == 201
+        rv = client.get("/sidebar")
+        assert rv.status_code == 200
+        assert b"Before</a>" in rv.data
+        rv = client.put("/sidebar/edit/save", json={"markdown": "# After"})
+        assert rv.status_code == 201
+        rv = client.get("/sidebar")
+        assert b"After</a>" in rv.data
+        assert b"Before</a>" not in rv.data
+        client.delete("/sidebar")
+
+    def test_autosaves_are_buffered(self, client: FlaskClient):
+        import self_wiki
+
+        path = pjoin(self_wiki.CONTENT_ROOT, "buffered.md")
+        rv = client.put(
+            "/buffered/edit/save",
+            json={"markdown": "# Draft", "autosave": True},
+        )
+        assert rv.status_code == 201
+        assert not exists(path)
+        assert b"<h1" in client.get("/buffered").data
+        assert b"Draft" in client.get("/buffered").data
+        rv = client.put("/buffered/edit/save", json={"markdown": "# Final"})
+        assert rv.status_code == 201
+        with open(path) as f:
+            assert f.read() == "# Final"
+        client.delete("/buffered")
+
+    def test_move_and_delete_subtree(self, client: FlaskClient):
+        for path, markdown in (
+            ("/moving", "# Moving"),
+            ("/moving/child", "# Child"),
+            ("/linking", "[child](/moving/child)"),
+        ):
+            rv = client.put(path + "/edit/save", json={"markdown": markdown})
+            assert rv.status_code == 201
+        rv = client.post("/moving/move", json={"to": "moved", "links": True})
+        assert rv.status_code == 201
+        assert rv.json["rewritten"] == ["linking.md"]
+        assert client.get("/moved/child").status_code == 200
+        assert client.get("/moving/child").status_code == 302
+        rv = client.post("/moved/move", json={"to": "linking"})
+        assert rv.status_code == 409
+        rv = client.delete("/moved?subtree=1")
+        assert rv.status_code == 201
+        assert sorted(rv.json["deleted"]) == ["moved.md", "moved/child.md"]
+        assert client.delete("/moved?subtree=1").status_code == 404
+        client.delete("/linking")
+
+
+class TestMetricsApi:
+    def test_metrics_disabled(self, client: FlaskClient):
+        from self_wiki.metrics import METRICS
+
+        METRICS.enabled = False
+        rv = client.get("/metrics")
+        assert rv.status_code == 404
+        assert "Server-Timing" not in rv.headers
+
+    def test_metrics_enabled(self, client: FlaskClient):
+        from self_wiki.metrics import METRICS
+
+        METRICS.enabled = True
+        try:
+            rv = client.get("/todo")
+            assert "total;dur=" in rv.headers["Server-Timing"]
+            rv = client.get("/metrics")
+            assert rv.status_code == 200
+            assert b'endpoint="todo"' in rv.data
+        finally:
+            METRICS.enabled = False
+            METRICS.reset()
+
+
+class TestProfiling:
+    def test_profile_with_token(self, client: FlaskClient):
+        from self_wiki.profiling import PROFILER
+
+        with TemporaryDirectory() as profile_dir:
+            PROFILER.token, PROFILER.directory = "s3cr3t", profile_dir
+            try:
+                client.get("/todo", headers={"X-Self-Wiki-Profile": "nope"})
+                assert not os.listdir(profile_dir)
+                client.get("/todo?profile=s3cr3t")
+                written = sorted(os.listdir(profile_dir))
+                assert [f.rsplit(".", 1)[1] for f in written] == [
+                    "json",
+                    "pstats",
+                    "txt",
+                ]
+            finally:
+                PROFILER.token = ""
+
+    def test_one_profile_at_a_time(self):
+        from self_wiki.profiling import RequestProfiler
+
+        with TemporaryDirectory() as profile_dir:
+            profiler = RequestProfiler("s3cr3t", profile_dir)
+            session = profiler.start()
+            assert session is not None
+            assert profiler.start() is None
+            session.stop("GET", "/")
+            second = profiler.start()
+            assert second is not None
+            second.stop("GET", "/")
+
+
+class TestAttachments:
+    def upload(self, client, name, data):
+        from io import BytesIO
+
+        rv = client.post(
+            "/edit/upload",
+            data={"file": (BytesIO(data), name)},
+            content_type="multipart/form-data",
+        )
+        assert rv.status_code == 201
+
+    def test_range_request(self, client: FlaskClient):
+        import self_wiki
+
+        self.upload(client, "range.bin", b"0123456789")
+        try:
+            rv = client.get("/range.bin")
+            assert rv.status_code == 200
+            assert rv.data == b"0123456789"
+            assert rv.headers["Accept-Ranges"] == "bytes"
+            rv = client.get("/range.bin", headers={"Range": "bytes=2-5"})
+            assert rv.status_code == 206
+            assert rv.data == b"2345"
+            assert rv.headers["Content-Range"] == "bytes 2-5/10"
+        finally:
+            os.remove(pjoin(self_wiki.CONTENT_ROOT, "range.bin"))
+
+    def test_accel_redirect(self, client: FlaskClient):
+        import self_wiki
+        from self_wiki import views
+
+        self.upload(client, "accel.pdf", b"%PDF")
+        views.SENDFILE = "x-accel-redirect"
+        try:
+            rv = client.get("/accel.pdf")
+            assert rv.status_code == 200
+            assert rv.data == b""
+            assert rv.headers["X-Accel-Redirect"] == "/_attachments/accel.pdf"
+            assert rv.headers["Content-Type"] == "application/pdf"
+        finally:
+            views.SENDFILE = ""
+            os.remove(pjoin(self_wiki.CONTENT_ROOT, "accel.pdf"))
+
+    def test_no_traversal(self, client: FlaskClient):
+        import self_wiki
+        from self_wiki import views
+
+        outside = pjoin(
+            os.path.dirname(self_wiki.CONTENT_ROOT.rstrip("/")),
+            "self_wiki_traversal.txt",
+        )
+        with open(outside, "w+") as outside_file:
+            outside_file.write("secret")
+        try:
+            url = "/../self_wiki_traversal.txt"
+            assert client.get(url).status_code == 404
+            views.SENDFILE = "x-accel-redirect"
+            rv = client.get(url)
+            assert rv.status_code == 404
+            assert "X-Accel-Redirect" not in rv.headers
+        finally:
+            views.SENDFILE = ""
+            os.remove(outside)
+
+    def test_multiple_files_are_deduplicated(self, client: FlaskClient):
+        from io import BytesIO
+
+        import self_wiki
+
+        rv = client.post(
+            "/attached/page/edit/upload",
+            data={
+                "file": [
+                    (BytesIO(b"same content"), "one.txt"),
+                    (BytesIO(b"same content"), "two.txt"),
+                ]
+            },
+            content_type="multipart/form-data",
+        )
+        assert rv.status_code == 201
+        assert rv.json["paths"] == ["/attached/one.txt", "/attached/two.txt"]
+        one = pjoin(self_wiki.CONTENT_ROOT, "attached", "one.txt")
+        two = pjoin(self_wiki.CONTENT_ROOT, "attached", "two.txt")
+        try:
+            assert os.path.samefile(one, two)
+            assert client.get("/attached/two.txt").data == b"same content"
+        finally:
+            os.remove(one)
+            os.remove(two)
+
+    def test_unstored_parts_are_removed(self, client: FlaskClient):
+        from io import BytesIO
+
+        import self_wiki
+
+        rv = client.post(
+            "/edit/upload",
+            data={
+                "file": (BytesIO(b"kept"), "kept.txt"),
+                "other": (BytesIO(b"ignored"), "ignored.txt"),
+            },
+            content_type="multipart/form-data",
+        )
+        assert rv.status_code == 201
+        os.remove(pjoin(self_wiki.CONTENT_ROOT, "kept.txt"))
+        rv = client.post(
+            "/edit/upload",
+            data={"file": (BytesIO(b"unnamed"), "")},
+            content_type="multipart/form-data",
+        )
+        assert rv.status_code == 400
+        tmp = pjoin(self_wiki.CONTENT_ROOT, ".attachments", "tmp")
+        assert not os.listdir(tmp)
+
+    def test_reserved_names_are_refused(self, client: FlaskClient):
+        from io import BytesIO
+
+        for name in ("page.md", "todos.json", "..", "."):
+            rv = client.post(
+                "/edit/upload",
+                data={"file": (BytesIO(b"[]"), name)},
+                content_type="multipart/form-data",
+            )
+            assert rv.status_code == 400
+
+
+class TestCompression:
+    def test_compressed_page(self, client: FlaskClient):
+        import gzip
+
+        client.put(
+            "/compressed/edit/save", json={"markdown": "# Compressed\n\nok"}
+        )
+        try:
+            plain = client.get("/compressed")
+            assert "Content-Encoding" not in plain.headers
+            rv = client.get("/compressed", headers={"Accept-Encoding": "gzip"})
+            assert rv.headers["Content-Encoding"] == "gzip"
+            assert "Accept-Encoding" in rv.headers["Vary"]
+            assert gzip.decompress(rv.data) == plain.data
+        finally:
+            client.delete("/compressed")
+
+    def test_precompressed_static(self, client: FlaskClient):
+        import gzip
+
+        from self_wiki import views
+        from self_wiki.compression import StaticPrecompressor
+
+        original = views.STATIC_ASSETS
+        with TemporaryDirectory() as cache_dir:
+            views.STATIC_ASSETS = StaticPrecompressor(
+                original.static_folder, cache_dir
+            )
+            try:
+                rv = client.get(
+                    "/static/app.js", headers={"Accept-Encoding": "gzip;q=1"}
+                )
+                assert rv.headers["Content-Encoding"] == "gzip"
+                assert exists(pjoin(cache_dir, "app.js.gz"))
+                with open(pjoin(original.static_folder, "app.js"), "rb") as f:
+                    assert gzip.decompress(rv.data) == f.read()
+                rv = client.get(
+                    "/static/app.js", headers={"Accept-Encoding": "gzip;q=0"}
+                )
+                assert "Content-Encoding" not in rv.headers
+                rv.close()
+            finally:
+                views.STATIC_ASSETS = original
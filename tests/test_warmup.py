@@ -0,0 +1,29 @@
+from os.path import join as pjoin
+from tempfile import TemporaryDirectory
+
+from self_wiki.render import BlockRenderer
+from self_wiki.warmup import WarmUp
+
+
+def test_warmup_fills_renderer_cache():
+    with TemporaryDirectory() as root:
+        paths = []
+        for i in range(20):
+            paths.append(pjoin(root, "page{}.md".format(i)))
+            with open(paths[-1], "w+") as f:
+                f.write("# Page {}\n\nSome *content*.".format(i))
+        done = []
+        renderer = BlockRenderer()
+        warmup = WarmUp(
+            renderer, paths, jobs=2, on_done=lambda: done.append(True)
+        )
+        assert warmup.run() == 20
+        assert done == [True]
+        renderer.render("# Page 3\n\nSome *content*.")
+        assert renderer.misses == 0 and renderer.hits == 2
+
+
+def test_warmup_time_budget():
+    renderer = BlockRenderer()
+    warmup = WarmUp(renderer, ["/nonexistent.md"], time_budget=0)
+    assert warmup.run() == 0
@@ -2,7 +2,7 @@ import pytest
 from os.path import exists, join as pjoin
 from tempfile import TemporaryDirectory
 
-from self_wiki.wiki import Page, RecentFileManager
+from self_wiki.wiki import Page, PageRef, RecentFileManager
 
 
 @pytest.fixture
@@ -81,9 +81,10 @@ def test_recent_files_manager_returns(tmp_root):
     rfm = RecentFileManager(tmp_root.name)
     assert type(rfm.get()) is list
     one = rfm.get()[0]
-    assert type(one) is dict
-    assert "mtime" in one.keys() and type(one["mtime"]) is float
-    assert "path" in one.keys() and type(one["path"]) is str
+    assert type(one) is PageRef
+    assert type(one.mtime) is float and one["mtime"] == one.mtime
+    assert one.relpath == "f1.md"
+    assert one["path"] == pjoin(tmp_root.name, "f1.md")
 
 
 def test_recent_file_manager_filtering(tmp_root):
@@ -95,3 +96,62 @@ def test_recent_file_manager_filtering(tmp_root):
     assert len(rfm.get()) == 1
     rfm = RecentFileManager(tmp_root.name, wanted_extensions=["md", "tgz"])
     assert len(rfm.get()) == 2
+
+
+def test_recent_file_manager_version(tmp_root):
+    rfm = RecentFileManager(tmp_root.name)
+    version = rfm.version
+    rfm.update("f1.md")
+    assert rfm.version > version
+    version = rfm.version
+    rfm.delete(pjoin(tmp_root.name, "f1.md"))
+    assert rfm.version > version
+
+
+def test_recent_file_manager_relative_paths(tmp_root):
+    rfm = RecentFileManager(tmp_root.name)
+    rfm.update("sub/f1.md")
+    rfm.update(pjoin(tmp_root.name, "sub", "f1.md"))
+    assert [ref.relpath for ref in rfm.get()] == ["sub/f1.md"]
+    rfm.delete(pjoin(tmp_root.name, "sub", "f1.md"))
+    assert not rfm.get()
+
+
+def test_page_ref(tmp_root):
+    with open(pjoin(tmp_root.name, "titled.md"), "w+") as f:
+        f.write("# A title\n\ncontent")
+    ref = PageRef(tmp_root.name, "titled.md", 1.0)
+    assert ref.title == "A title"
+    assert ref.path == pjoin(tmp_root.name, "titled.md")
+    assert ref == PageRef(tmp_root.name, "titled.md")
+    assert not hasattr(ref, "__dict__")
+    with pytest.raises(KeyError):
+        ref["title"]
+
+
+def test_page_children_are_refs(tmp_root):
+    Page("parent", root=tmp_root.name).save()
+    child = Page("parent/child", root=tmp_root.name)
+    child.markdown = "# Child"
+    child.save()
+    parent = Page("parent", root=tmp_root.name)
+    assert parent.subpages == [PageRef(tmp_root.name, "parent/child.md")]
+    assert parent.subpages[0].title == "Child"
+
+
+def test_unchanged_page_is_not_committed(tmp_root):
+    from git import Repo
+
+    from self_wiki import wiki
+
+    repo = Repo.init(tmp_root.name)
+    wiki.repositories[tmp_root.name] = repo
+    try:
+        page = Page("committed", root=tmp_root.name)
+        page.markdown = "# Committed"
+        page.save()
+        head = repo.head.commit.hexsha
+        page.save()
+        assert repo.head.commit.hexsha == head
+    finally:
+        del wiki.repositories[tmp_root.name]